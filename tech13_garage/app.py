@@ -1,16 +1,44 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory, g, has_request_context
+from flask.sessions import SessionInterface, SessionMixin
 import sqlite3
 import json
 import os
+import base64
+import binascii
+import hashlib
+import gzip
+import tempfile
+import re
+import threading
+import time
 import mimetypes
-import random
+import secrets
 import string
 import csv
+import subprocess
+import sys
 import datetime
-from datetime import datetime
-from io import StringIO
+from datetime import datetime, timedelta, timezone
+from io import StringIO, TextIOWrapper
+from collections import OrderedDict
+from functools import wraps
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import CallbackDict
+from markupsafe import Markup, escape
+import click
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing: uploads are served without resized variants
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # brotli missing: static assets are precompressed with gzip only
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'tech13_garage_secret_key_2024'
@@ -19,283 +47,662 @@ app.secret_key = 'tech13_garage_secret_key_2024'
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['DATABASE'] = os.environ.get('TECH13_DATABASE', 'tech13_garage.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('TECH13_DB_POOL_SIZE', 8))
+# Opt-in statement timing, per-route latency histograms and slow-query logging (/admin/metrics)
+app.config['INSTRUMENTATION'] = os.environ.get('TECH13_INSTRUMENTATION') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('TECH13_SLOW_QUERY_MS', 100))
+app.config['SEARCH_SNIPPETS'] = True
+app.config['PAGE_SIZE'] = 24  # storefront product grid
+app.config['ADMIN_PAGE_SIZE'] = 50
+app.config['MAX_PAGE_SIZE'] = 200
+app.config['DASHBOARD_CACHE_TTL'] = 30  # seconds
+app.config['INVENTORY_SNAPSHOT_INTERVAL'] = 50  # ledger rows per product between automatic stock snapshots
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('TECH13_PAGE_CACHE_SIZE', 256))  # rendered pages kept per process
+app.config['SESSION_BACKEND'] = os.environ.get('TECH13_SESSION_BACKEND', 'sqlite')  # 'sqlite' or 'memory' (single process only)
+app.config['SESSION_CACHE_SIZE'] = 10000  # sessions kept by the memory backend
+
+# Resized copies generated for every uploaded image: name -> max width in pixels
+IMAGE_VARIANTS = {'thumb': 320, 'card': 640, 'full': 1600}
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_FOLDER = os.path.join(UPLOAD_FOLDER, 'variants')
+# Build variants on a background thread so the upload request returns once the original is stored
+app.config['BACKGROUND_IMAGE_VARIANTS'] = os.environ.get('TECH13_BACKGROUND_IMAGE_VARIANTS') == '1'
+# Uploads are stored once per distinct content, under blobs/<first 2 hex>/<sha256>.<ext>
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')
+# Tables whose image column points at an upload: table -> column
+UPLOAD_OWNERS = {
+    'products': 'image',
+    'services': 'image',
+    'awards': 'image',
+    'team_members': 'image',
+    'collaborate_teams': 'logo',
+    'users': 'profile_image',
+}
+app.config['UPLOAD_GC_GRACE_SECONDS'] = 3600  # unreferenced blobs uploaded more recently than this are kept
+app.config['ASSET_FINGERPRINTS'] = True
+ASSET_MAX_AGE = 31536000  # one year, for URLs that change whenever the content does
+COMPRESSIBLE_ASSET_TYPES = ('.css', '.js', '.svg', '.txt', '.json')
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(VARIANT_FOLDER, exist_ok=True)
+os.makedirs(BLOB_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Initialize SQLite database and create tables
-def init_db():
-    conn = None
+# Schema migrations
+# Migrations run once each, in order. PRAGMA user_version records the last one applied,
+# so an up-to-date database is recognised without touching any table.
+def migrate_create_tables(c):
+    """Create the base tables"""
+    # Create users table for customers and admin
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            email TEXT UNIQUE,
+            password TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            phone TEXT,
+            address TEXT,
+            role TEXT DEFAULT 'customer',
+            created_at TEXT,
+            profile_image TEXT
+        )
+    ''')
+
+    # Create categories table for motorcycle parts
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            description TEXT,
+            image TEXT
+        )
+    ''')
+
+    # Create products table for motorcycle parts
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            price REAL NOT NULL,
+            category_id INTEGER,
+            brand TEXT,
+            model TEXT,
+            year_range TEXT,
+            stock_quantity INTEGER DEFAULT 0,
+            image TEXT,
+            is_racing BOOLEAN DEFAULT 0,
+            is_daily BOOLEAN DEFAULT 1,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+
+    # Create services table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS services (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            price REAL NOT NULL,
+            duration_hours INTEGER,
+            is_racing BOOLEAN DEFAULT 0,
+            is_daily BOOLEAN DEFAULT 1,
+            image TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+
+    # Create orders table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER,
+            order_number TEXT UNIQUE,
+            total_amount REAL,
+            status TEXT DEFAULT 'pending',
+            order_date TEXT,
+            delivery_address TEXT,
+            phone TEXT,
+            notes TEXT,
+            FOREIGN KEY (customer_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create order_items table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY,
+            order_id INTEGER,
+            product_id INTEGER,
+            service_id INTEGER,
+            quantity INTEGER,
+            price REAL,
+            item_type TEXT, -- 'product' or 'service'
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (service_id) REFERENCES services (id)
+        )
+    ''')
+
+    # Create cart table for session-based cart
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS cart (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT,
+            product_id INTEGER,
+            service_id INTEGER,
+            quantity INTEGER,
+            item_type TEXT,
+            created_at TEXT,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (service_id) REFERENCES services (id)
+        )
+    ''')
+
+    # Create reviews table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER,
+            product_id INTEGER,
+            service_id INTEGER,
+            rating INTEGER,
+            comment TEXT,
+            created_at TEXT,
+            FOREIGN KEY (customer_id) REFERENCES users (id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (service_id) REFERENCES services (id)
+        )
+    ''')
+
+    # Create inventory_transactions table for tracking all inventory movements
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_transactions (
+            id INTEGER PRIMARY KEY,
+            product_id INTEGER,
+            transaction_type TEXT, -- 'sale', 'walkin', 'return', 'adjustment', 'restock'
+            quantity INTEGER, -- positive for additions, negative for subtractions
+            order_id INTEGER, -- NULL for walk-in sales
+            customer_id INTEGER, -- NULL for walk-in sales
+            admin_id INTEGER, -- who processed the transaction
+            notes TEXT,
+            transaction_date TEXT,
+            unit_price REAL,
+            total_amount REAL,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (customer_id) REFERENCES users (id),
+            FOREIGN KEY (admin_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create walkin_sales table for tracking walk-in purchases
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS walkin_sales (
+            id INTEGER PRIMARY KEY,
+            sale_number TEXT UNIQUE,
+            customer_name TEXT,
+            customer_phone TEXT,
+            total_amount REAL,
+            payment_method TEXT, -- 'cash', 'card', 'other'
+            admin_id INTEGER,
+            sale_date TEXT,
+            notes TEXT,
+            FOREIGN KEY (admin_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create walkin_sale_items table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS walkin_sale_items (
+            id INTEGER PRIMARY KEY,
+            walkin_sale_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            unit_price REAL,
+            total_price REAL,
+            FOREIGN KEY (walkin_sale_id) REFERENCES walkin_sales (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+    # Create team table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS team_members (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL,
+            description TEXT,
+            image TEXT,
+            linkedin_url TEXT,
+            twitter_url TEXT,
+            instagram_url TEXT,
+            display_order INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+
+    # Create collaborate teams table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS collaborate_teams (
+            id INTEGER PRIMARY KEY,
+            team_name TEXT NOT NULL,
+            logo TEXT,
+            description TEXT,
+            website_url TEXT,
+            contact_email TEXT,
+            contact_phone TEXT,
+            partnership_type TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            display_order INTEGER DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+
+    # Create awards table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS awards (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            subtitle TEXT,
+            image TEXT,
+            year INTEGER,
+            category TEXT,
+            description TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            display_order INTEGER DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+
+def add_column_if_missing(c, table, column, definition):
+    columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})').fetchall()]
+    if column not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def migrate_add_missing_columns(c):
+    """Add columns that older databases were created without"""
+    add_column_if_missing(c, 'services', 'updated_at', 'TEXT')
+    add_column_if_missing(c, 'services', 'image', 'TEXT')
+    add_column_if_missing(c, 'categories', 'updated_at', 'TEXT')
+    add_column_if_missing(c, 'categories', 'created_at', 'TEXT')
+
+# Secondary indexes for the hot storefront and admin queries (see HOT_QUERIES)
+SECONDARY_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_cart_session ON cart (session_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cart_product ON cart (product_id)',
+    'CREATE INDEX IF NOT EXISTS idx_cart_service ON cart (service_id)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders (customer_id, order_date)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_status_total ON orders (status, total_amount)',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id)',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_service ON order_items (service_id)',
+    'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_type_product ON inventory_transactions (transaction_type, product_id, quantity)',
+    'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_product ON inventory_transactions (product_id, transaction_date)',
+    'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_date ON inventory_transactions (transaction_date)',
+    'CREATE INDEX IF NOT EXISTS idx_products_category_stock ON products (category_id, stock_quantity)',
+    'CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock_quantity)',
+    'CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_product ON reviews (product_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_users_role_created ON users (role, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_walkin_sales_date ON walkin_sales (sale_date)',
+    'CREATE INDEX IF NOT EXISTS idx_walkin_sale_items_sale ON walkin_sale_items (walkin_sale_id)',
+    'CREATE INDEX IF NOT EXISTS idx_walkin_sale_items_product ON walkin_sale_items (product_id)',
+]
+
+def migrate_secondary_indexes(c):
+    """Create secondary indexes for the hot queries"""
+    for statement in SECONDARY_INDEXES:
+        c.execute(statement)
+
+def fts5_available():
+    """Check whether this SQLite build ships the FTS5 extension"""
+    conn = sqlite3.connect(':memory:')
     try:
-        conn = sqlite3.connect('tech13_garage.db', timeout=30)
-        conn.execute('PRAGMA journal_mode=WAL')
-        conn.execute('PRAGMA foreign_keys = ON')
-        c = conn.cursor()
-
-        # Create users table for customers and admin
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                username TEXT UNIQUE,
-                email TEXT UNIQUE,
-                password TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                phone TEXT,
-                address TEXT,
-                role TEXT DEFAULT 'customer',
-                created_at TEXT,
-                profile_image TEXT
-            )
-        ''')
+        conn.execute('CREATE VIRTUAL TABLE fts5_probe USING fts5(body)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
 
-        # Create categories table for motorcycle parts
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE,
-                description TEXT,
-                image TEXT
-            )
-        ''')
+FTS5_AVAILABLE = fts5_available()
 
-        # Create products table for motorcycle parts
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                category_id INTEGER,
-                brand TEXT,
-                model TEXT,
-                year_range TEXT,
-                stock_quantity INTEGER DEFAULT 0,
-                image TEXT,
-                is_racing BOOLEAN DEFAULT 0,
-                is_daily BOOLEAN DEFAULT 1,
-                created_at TEXT,
-                updated_at TEXT,
-                FOREIGN KEY (category_id) REFERENCES categories (id)
-            )
-        ''')
+def migrate_product_search(c):
+    """Full-text index over product name, description and brand, kept in sync by triggers"""
+    if not FTS5_AVAILABLE:
+        return  # products() falls back to LIKE search; init_db builds the index under a build with FTS5
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, brand,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description, brand)
+            VALUES (new.id, new.name, new.description, new.brand);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, brand)
+            VALUES ('delete', old.id, old.name, old.description, old.brand);
+        END
+    ''')
+    # Only text edits touch the index; stock updates don't fire this trigger
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description, brand ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, brand)
+            VALUES ('delete', old.id, old.name, old.description, old.brand);
+            INSERT INTO products_fts (rowid, name, description, brand)
+            VALUES (new.id, new.name, new.description, new.brand);
+        END
+    ''')
+    c.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
 
-        # Create services table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS services (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                duration_hours INTEGER,
-                is_racing BOOLEAN DEFAULT 0,
-                is_daily BOOLEAN DEFAULT 1,
-                image TEXT,
-                created_at TEXT,
-                updated_at TEXT
-            )
-        ''')
+def migrate_backfill_created_at(c):
+    """Give every product and user a created_at so keyset pagination can reach them"""
+    c.execute("UPDATE products SET created_at = COALESCE(updated_at, '1970-01-01T00:00:00') WHERE created_at IS NULL")
+    c.execute("UPDATE users SET created_at = '1970-01-01T00:00:00' WHERE created_at IS NULL")
 
-        # Create orders table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY,
-                customer_id INTEGER,
-                order_number TEXT UNIQUE,
-                total_amount REAL,
-                status TEXT DEFAULT 'pending',
-                order_date TEXT,
-                delivery_address TEXT,
-                phone TEXT,
-                notes TEXT,
-                FOREIGN KEY (customer_id) REFERENCES users (id)
-            )
-        ''')
+def migrate_inventory_stats(c):
+    """Per-product inventory counters maintained alongside inventory_transactions"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS product_inventory_stats (
+            product_id INTEGER PRIMARY KEY,
+            total_sold INTEGER DEFAULT 0, -- online orders
+            total_walkin INTEGER DEFAULT 0,
+            total_restock INTEGER DEFAULT 0,
+            total_returned INTEGER DEFAULT 0,
+            net_adjustment INTEGER DEFAULT 0,
+            updated_at TEXT,
+            FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+        )
+    ''')
+    rebuild_inventory_stats(c)
 
-        # Create order_items table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                id INTEGER PRIMARY KEY,
-                order_id INTEGER,
-                product_id INTEGER,
-                service_id INTEGER,
-                quantity INTEGER,
-                price REAL,
-                item_type TEXT, -- 'product' or 'service'
-                FOREIGN KEY (order_id) REFERENCES orders (id),
-                FOREIGN KEY (product_id) REFERENCES products (id),
-                FOREIGN KEY (service_id) REFERENCES services (id)
-            )
-        ''')
+def migrate_image_variants(c):
+    """Resized WebP/JPEG copies generated for each uploaded image"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            id INTEGER PRIMARY KEY,
+            image TEXT NOT NULL, -- original filename in static/uploads
+            variant TEXT NOT NULL, -- 'thumb', 'card' or 'full'
+            format TEXT NOT NULL, -- 'webp' or 'jpeg'
+            width INTEGER,
+            height INTEGER,
+            path TEXT NOT NULL, -- relative to static/
+            created_at TEXT,
+            UNIQUE (image, variant, format)
+        )
+    ''')
 
-        # Create cart table for session-based cart
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS cart (
-                id INTEGER PRIMARY KEY,
-                session_id TEXT,
-                product_id INTEGER,
-                service_id INTEGER,
-                quantity INTEGER,
-                item_type TEXT,
-                created_at TEXT,
-                FOREIGN KEY (product_id) REFERENCES products (id),
-                FOREIGN KEY (service_id) REFERENCES services (id)
-            )
-        ''')
+# One cart row per item; NULL never equals NULL in a UNIQUE index, hence the IFNULLs.
+# Upserts must name exactly these expressions as their conflict target.
+CART_ITEM_KEY = 'session_id, item_type, IFNULL(product_id, 0), IFNULL(service_id, 0)'
 
-        # Create reviews table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY,
-                customer_id INTEGER,
-                product_id INTEGER,
-                service_id INTEGER,
-                rating INTEGER,
-                comment TEXT,
-                created_at TEXT,
-                FOREIGN KEY (customer_id) REFERENCES users (id),
-                FOREIGN KEY (product_id) REFERENCES products (id),
-                FOREIGN KEY (service_id) REFERENCES services (id)
-            )
-        ''')
+def migrate_cart_unique_items(c):
+    """Merge duplicate cart rows and enforce one row per (session, item)"""
+    c.execute(f'''
+        UPDATE cart SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart dup
+            WHERE dup.session_id = cart.session_id AND dup.item_type = cart.item_type
+              AND IFNULL(dup.product_id, 0) = IFNULL(cart.product_id, 0)
+              AND IFNULL(dup.service_id, 0) = IFNULL(cart.service_id, 0)
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart GROUP BY {CART_ITEM_KEY})
+    ''')
+    c.execute(f'DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY {CART_ITEM_KEY})')
+    c.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_item ON cart ({CART_ITEM_KEY})')
 
-        # Create inventory_transactions table for tracking all inventory movements
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS inventory_transactions (
-                id INTEGER PRIMARY KEY,
-                product_id INTEGER,
-                transaction_type TEXT, -- 'sale', 'walkin', 'return', 'adjustment', 'restock'
-                quantity INTEGER, -- positive for additions, negative for subtractions
-                order_id INTEGER, -- NULL for walk-in sales
-                customer_id INTEGER, -- NULL for walk-in sales
-                admin_id INTEGER, -- who processed the transaction
-                notes TEXT,
-                transaction_date TEXT,
-                unit_price REAL,
-                total_amount REAL,
-                FOREIGN KEY (product_id) REFERENCES products (id),
-                FOREIGN KEY (order_id) REFERENCES orders (id),
-                FOREIGN KEY (customer_id) REFERENCES users (id),
-                FOREIGN KEY (admin_id) REFERENCES users (id)
-            )
-        ''')
+def migrate_document_sequences(c):
+    """Per-day counters behind order and walk-in sale numbers"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS document_sequences (
+            prefix TEXT NOT NULL, -- 'TECH13' or 'WALKIN'
+            day TEXT NOT NULL, -- YYYYMMDD
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY (prefix, day)
+        ) WITHOUT ROWID
+    ''')
 
-        # Create walkin_sales table for tracking walk-in purchases
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS walkin_sales (
-                id INTEGER PRIMARY KEY,
-                sale_number TEXT UNIQUE,
-                customer_name TEXT,
-                customer_phone TEXT,
-                total_amount REAL,
-                payment_method TEXT, -- 'cash', 'card', 'other'
-                admin_id INTEGER,
-                sale_date TEXT,
-                notes TEXT,
-                FOREIGN KEY (admin_id) REFERENCES users (id)
-            )
-        ''')
+def migrate_inventory_snapshots(c):
+    """Stock snapshots over the inventory ledger, plus opening balances so the ledger adds up"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshots (
+            product_id INTEGER NOT NULL,
+            ledger_id INTEGER NOT NULL, -- last inventory_transactions.id included
+            stock INTEGER NOT NULL,
+            as_of TEXT NOT NULL, -- latest transaction_date included
+            taken_at TEXT NOT NULL,
+            PRIMARY KEY (product_id, ledger_id),
+            FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_inventory_transactions_product_id ON inventory_transactions (product_id, id)')
 
-        # Create walkin_sale_items table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS walkin_sale_items (
-                id INTEGER PRIMARY KEY,
-                walkin_sale_id INTEGER,
-                product_id INTEGER,
-                quantity INTEGER,
-                unit_price REAL,
-                total_price REAL,
-                FOREIGN KEY (walkin_sale_id) REFERENCES walkin_sales (id),
-                FOREIGN KEY (product_id) REFERENCES products (id)
-            )
-        ''')
+    # Stock set by hand on the product forms never reached the ledger before now
+    record_opening_balances(c)
+    rebuild_inventory_stats(c)
+    take_inventory_snapshots(c)
 
-        # Create team table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS team_members (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                description TEXT,
-                image TEXT,
-                linkedin_url TEXT,
-                twitter_url TEXT,
-                instagram_url TEXT,
-                display_order INTEGER DEFAULT 0,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TEXT,
-                updated_at TEXT
-            )
-        ''')
+def record_opening_balances(c):
+    """Ledger an adjustment, dated at product creation, for stock the ledger does not account for"""
+    c.execute('''
+        INSERT INTO inventory_transactions (product_id, transaction_type, quantity, notes, transaction_date, unit_price, total_amount)
+        SELECT p.id, 'adjustment', p.stock_quantity - COALESCE(ledger.total, 0), 'Opening balance',
+               COALESCE(p.created_at, ?), 0, 0
+        FROM products p
+        LEFT JOIN (SELECT product_id, SUM(quantity) as total FROM inventory_transactions GROUP BY product_id) ledger
+               ON ledger.product_id = p.id
+        WHERE p.stock_quantity != COALESCE(ledger.total, 0)
+    ''', (datetime.now().isoformat(),))
 
-        # Create collaborate teams table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS collaborate_teams (
-                id INTEGER PRIMARY KEY,
-                team_name TEXT NOT NULL,
-                logo TEXT,
-                description TEXT,
-                website_url TEXT,
-                contact_email TEXT,
-                contact_phone TEXT,
-                partnership_type TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                display_order INTEGER DEFAULT 0,
-                created_at TEXT,
-                updated_at TEXT
-            )
-        ''')
+def migrate_table_versions(c):
+    """Write counters behind the page, validator and variant caches, shared by every process"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+def migrate_upload_blob_last_seen(c):
+    """When each blob was last uploaded, so gc-uploads spares blobs that were just reused"""
+    c.execute('ALTER TABLE upload_blobs ADD COLUMN last_seen_at TEXT')
+    c.execute('UPDATE upload_blobs SET last_seen_at = created_at')
+
+def migrate_sales_rollups(c):
+    """Daily, weekly and monthly sales totals, backfilled from existing orders and walk-in sales"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sales_rollups (
+            period TEXT NOT NULL, -- 'day', 'week' or 'month'
+            dimension TEXT NOT NULL, -- 'total', 'product', 'service', 'category' or 'payment_method'
+            period_start TEXT NOT NULL, -- YYYY-MM-DD; weeks start on Monday
+            channel TEXT NOT NULL, -- 'online' or 'walkin'
+            dimension_key TEXT NOT NULL, -- id or payment method; '' for totals
+            units INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            documents INTEGER NOT NULL DEFAULT 0, -- orders and walk-in sales counted
+            PRIMARY KEY (period, dimension, period_start, channel, dimension_key)
+        ) WITHOUT ROWID
+    ''')
+    rebuild_sales_rollups(c)
+
+# A product is identified by brand, model and name for catalog imports (see CART_ITEM_KEY
+# for why the IFNULLs)
+PRODUCT_KEY = "IFNULL(brand, ''), IFNULL(model, ''), name"
+
+def migrate_product_key(c):
+    """Enforce one product per (brand, model, name); existing duplicates stop the migration"""
+    # Duplicates are storefront data with their own history, so an admin decides how to resolve them
+    duplicates = c.execute(f'''
+        SELECT brand, model, name, GROUP_CONCAT(id, ', ') as ids FROM products
+        GROUP BY {PRODUCT_KEY} HAVING COUNT(*) > 1
+    ''').fetchall()
+    if duplicates:
+        listing = '; '.join(f"{' '.join(filter(None, row[:3]))} (ids {row[3]})" for row in duplicates)
+        raise RuntimeError(f"Products share a brand, model and name: {listing}. Rename or delete the "
+                           "duplicates, then run `flask --app app init-db` to finish the upgrade.")
+    c.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_products_key ON products ({PRODUCT_KEY})')
+
+def migrate_sessions(c):
+    """Server-side session records; the cookie only carries the id"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER, -- lets a role change revoke every session of the user
+            data TEXT NOT NULL, -- JSON
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
 
-        # Create awards table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS awards (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                subtitle TEXT,
-                image TEXT,
-                year INTEGER,
-                category TEXT,
-                description TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                display_order INTEGER DEFAULT 0,
-                created_at TEXT,
-                updated_at TEXT
-            )
+def migrate_upload_blobs(c):
+    """Content-addressed upload blobs and the rows that reference them"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS upload_blobs (
+            hash TEXT PRIMARY KEY, -- sha256 of the file contents
+            path TEXT UNIQUE NOT NULL, -- relative to static/uploads
+            size INTEGER,
+            created_at TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS upload_refs (
+            owner_table TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            image TEXT NOT NULL, -- value of the owner's image/logo column
+            PRIMARY KEY (owner_table, owner_id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_upload_refs_image ON upload_refs (image)')
+    
+    # Triggers keep upload_refs in step with every owner table's image column
+    for table, column in UPLOAD_OWNERS.items():
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_upload_ref_insert AFTER INSERT ON {table}
+            WHEN new.{column} IS NOT NULL BEGIN
+                INSERT OR REPLACE INTO upload_refs (owner_table, owner_id, image)
+                VALUES ('{table}', new.id, new.{column});
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_upload_ref_update AFTER UPDATE OF {column} ON {table} BEGIN
+                DELETE FROM upload_refs WHERE owner_table = '{table}' AND owner_id = old.id;
+                INSERT INTO upload_refs (owner_table, owner_id, image)
+                SELECT '{table}', new.id, new.{column} WHERE new.{column} IS NOT NULL;
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_upload_ref_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM upload_refs WHERE owner_table = '{table}' AND owner_id = old.id;
+            END
+        ''')
+        c.execute(f'''
+            INSERT OR REPLACE INTO upload_refs (owner_table, owner_id, image)
+            SELECT '{table}', id, {column} FROM {table} WHERE {column} IS NOT NULL
         ''')
 
-        # Add missing columns to existing tables
-        try:
-            # Add updated_at column to services table if it doesn't exist
-            c.execute("ALTER TABLE services ADD COLUMN updated_at TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
-        try:
-            # Add image column to services table if it doesn't exist
-            c.execute("ALTER TABLE services ADD COLUMN image TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
-        try:
-            # Add updated_at column to categories table if it doesn't exist
-            c.execute("ALTER TABLE categories ADD COLUMN updated_at TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
+MIGRATIONS = [
+    (1, migrate_create_tables),
+    (2, migrate_add_missing_columns),
+    (3, migrate_secondary_indexes),
+    (4, migrate_product_search),
+    (5, migrate_backfill_created_at),
+    (6, migrate_inventory_stats),
+    (7, migrate_image_variants),
+    (8, migrate_upload_blobs),
+    (9, migrate_sessions),
+    (10, migrate_cart_unique_items),
+    (11, migrate_document_sequences),
+    (12, migrate_inventory_snapshots),
+    (13, migrate_product_key),
+    (14, migrate_sales_rollups),
+    (15, migrate_table_versions),
+    (16, migrate_upload_blob_last_seen),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def product_search_missing(conn):
+    """True when this build has FTS5 but migration 4 ran under one without it"""
+    return FTS5_AVAILABLE and not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'").fetchone()
+
+def run_migrations(conn):
+    """Apply pending migrations, each in its own transaction. Returns the versions applied."""
+    applied = []
+    for version, migration in MIGRATIONS:
+        # Re-check under the write lock so concurrent workers never apply a migration twice
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            # Add created_at column to categories table if it doesn't exist
-            c.execute("ALTER TABLE categories ADD COLUMN created_at TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
 
+def build_missing_product_search(conn):
+    """Build the search index migration 4 skipped for lack of FTS5. Returns whether it was built."""
+    # user_version already records migration 4, so this runs outside the version chain
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        built = bool(product_search_missing(conn))
+        if built:
+            migrate_product_search(conn.cursor())
         conn.commit()
-        print("Database initialized successfully!")
+    except Exception:
+        conn.rollback()
+        raise
+    return built
+
+# Initialize SQLite database and create tables
+def init_db():
+    conn = None
+    try:
+        conn = sqlite3.connect(app.config['DATABASE'], timeout=30)
+        # Fast path for every process start after the first: one pragma read, no write lock
+        if get_schema_version(conn) >= SCHEMA_VERSION and not product_search_missing(conn):
+            return
         
-        # Insert sample data
-        insert_sample_data(c)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        applied = run_migrations(conn)
+        if applied:
+            print(f"Applied schema migrations: {', '.join(map(str, applied))}")
+        if build_missing_product_search(conn):
+            print("Built the product search index")
+        print("Database initialized successfully!")
         
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -303,6 +710,18 @@ def init_db():
         if conn:
             conn.close()
 
+def seed_sample_data(conn):
+    """Insert the demo admin, categories, products and services into a database with no users"""
+    if conn.execute('SELECT 1 FROM users LIMIT 1').fetchone():
+        return False
+    insert_sample_data(conn.cursor())
+    record_opening_balances(conn)
+    rebuild_inventory_stats(conn)
+    take_inventory_snapshots(conn)
+    conn.commit()
+    tables_changed('users', 'categories', 'products', 'services', 'inventory_transactions')
+    return True
+
 def insert_sample_data(cursor):
     # Insert admin user
     admin_password = generate_password_hash('admin123')
@@ -344,9 +763,9 @@ def insert_sample_data(cursor):
     for product in products:
         cursor.execute('''
             INSERT OR IGNORE INTO products 
-            (name, description, price, category_id, brand, model, year_range, stock_quantity, is_racing, is_daily)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', product)
+            (name, description, price, category_id, brand, model, year_range, stock_quantity, is_racing, is_daily, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', product + (datetime.now().isoformat(), datetime.now().isoformat()))
 
     # Insert sample services
     services = [
@@ -367,11 +786,742 @@ def insert_sample_data(cursor):
             VALUES (?, ?, ?, ?, ?, ?)
         ''', service)
 
+# Database connection pool
+# Per-connection pragmas applied once when a pooled connection is opened.
+# journal_mode=WAL is persistent in the database file and set by init_db().
+DB_PRAGMAS = (
+    ('foreign_keys', 'ON'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),  # 16 MB page cache
+    ('mmap_size', 134217728),  # 128 MB memory-mapped I/O
+    ('busy_timeout', 5000),
+    ('temp_store', 'MEMORY'),
+)
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection owned by a ConnectionPool.
+
+    close() is a no-op so routes can keep calling conn.close(); the
+    connection goes back to the pool in the app context teardown.
+    """
+
+    def close(self):
+        pass
+
+    def really_close(self):
+        sqlite3.Connection.close(self)
+
+# Instrumentation
+# Aggregates are per process; with several gunicorn workers each one reports its own.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values"""
+
+    def __init__(self, label_names, buckets=LATENCY_BUCKETS):
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self, name, help_text):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        with self._lock:
+            series_items = sorted(self._series.items())
+        for labels, series in series_items:
+            label_text = ','.join(f'{key}="{prometheus_escape(value)}"' for key, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {series[-2]}')
+            lines.append(f'{name}_count{{{label_text}}} {series[-2]}')
+            lines.append(f'{name}_sum{{{label_text}}} {series[-1]:.6f}')
+        return lines
+
+def prometheus_escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+request_latency = Histogram(('endpoint', 'method', 'status'))
+query_latency = Histogram(('endpoint',))
+slow_query_counts = {}  # endpoint -> count
+slow_query_lock = threading.Lock()
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+def record_query(conn, sql, parameters, elapsed):
+    """Time a statement and log it with its query plan when it is slower than SLOW_QUERY_MS"""
+    endpoint = current_endpoint()
+    query_latency.observe((endpoint,), elapsed)
+    if elapsed * 1000 < app.config['SLOW_QUERY_MS'] or sql.lstrip().upper().startswith(('EXPLAIN', 'PRAGMA', 'BEGIN')):
+        return
+    with slow_query_lock:
+        slow_query_counts[endpoint] = slow_query_counts.get(endpoint, 0) + 1
+    try:
+        # The base class execute, so the plan lookup is not itself timed
+        plan = [row[3] for row in sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', parameters)]
+    except sqlite3.Error as e:
+        plan = [f'(no plan: {e})']
+    app.logger.warning('Slow query (%.1f ms) in %s: %s\n  plan: %s',
+                       elapsed * 1000, endpoint, ' '.join(sql.split()), '; '.join(plan))
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(self.connection, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(self.connection, sql, seq_of_parameters[0] if seq_of_parameters else (),
+                         time.perf_counter() - started)
+
+class InstrumentedConnection(PooledConnection):
+    """PooledConnection whose statements are all timed, including those run through cursors"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+@app.before_request
+def start_request_timer():
+    if app.config['INSTRUMENTATION']:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe((current_endpoint(), request.method, str(response.status_code)),
+                                time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def record_failed_request_latency(exception=None):
+    # after_request does not run when a view raises
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe((current_endpoint(), request.method, '500'), time.perf_counter() - started)
+
+class ConnectionPool:
+    """Per-process pool of warm SQLite connections with tuned pragmas."""
+
+    def __init__(self, database, max_idle=8, factory=PooledConnection):
+        self.database = database
+        self.max_idle = max_idle
+        self.factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=30, check_same_thread=False,
+                               factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in DB_PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _check_fork(self):
+        # Connections must never be shared across a fork (e.g. gunicorn preload_app)
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+            self.in_use = 0
+
+    def acquire(self):
+        with self._lock:
+            self._check_fork()
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.in_use += 1
+        if conn is None:
+            conn = self._connect()
+        return conn
+
+    def release(self, conn, discard=False):
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        with self._lock:
+            self._check_fork()
+            self.in_use = max(self.in_use - 1, 0)
+            if not discard and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.discarded += 1
+        conn.really_close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'database': self.database,
+                'max_idle': self.max_idle,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+db_pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'],
+                         InstrumentedConnection if app.config['INSTRUMENTATION'] else PooledConnection)
+
 # Database helper functions
 def get_db_connection():
-    conn = sqlite3.connect('tech13_garage.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return the pooled connection bound to the current app context"""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn, discard=isinstance(exception, sqlite3.DatabaseError))
+
+# Server-side sessions
+# The cookie carries an opaque random id; the data (user id, role, name, flashes) lives in
+# a session store. The user fields are written at login, so is_admin() needs no query, and
+# revoke_user() drops every session of a user the moment their role changes.
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class MemorySessionStore:
+    """In-process LRU store; sessions are lost on restart and not shared between workers"""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (user_id, data, expires_at)
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return dict(entry[1])
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._entries[sid] = (data.get('user_id'), dict(data), expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            for sid in [sid for sid, entry in self._entries.items() if entry[0] == user_id]:
+                del self._entries[sid]
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items() if entry[2] < now]
+            for sid in expired:
+                del self._entries[sid]
+        return len(expired)
+
+class SQLiteSessionStore:
+    """Sessions table in the application database, shared by every worker"""
+    # Uses its own pooled connection so saving a session never commits a view's transaction
+    def _run(self, sql, params=()):
+        conn = db_pool.acquire()
+        try:
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall()
+            conn.commit()
+            return rows, cursor.rowcount
+        finally:
+            db_pool.release(conn)
+
+    def load(self, sid):
+        rows, _ = self._run('SELECT data FROM sessions WHERE id = ? AND expires_at >= ?', (sid, time.time()))
+        return json.loads(rows[0]['data']) if rows else None
+
+    def save(self, sid, data, expires_at):
+        self._run('''
+            INSERT INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                user_id = excluded.user_id, data = excluded.data, expires_at = excluded.expires_at
+        ''', (sid, data.get('user_id'), json.dumps(data), expires_at))
+
+    def delete(self, sid):
+        self._run('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def revoke_user(self, user_id):
+        self._run('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+
+    def purge_expired(self):
+        return self._run('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))[1]
+
+SESSION_STORES = {
+    'sqlite': SQLiteSessionStore,
+    'memory': lambda: MemorySessionStore(app.config['SESSION_CACHE_SIZE']),
+}
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        data = self.store.load(sid) if sid else None
+        if data is None:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+        return ServerSession(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+        
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.modified and not session.new:
+            return
+        
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, dict(session), expires_at)
+        response.set_cookie(cookie_name, session.sid,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+session_store = SESSION_STORES[app.config['SESSION_BACKEND']]()
+app.session_interface = ServerSessionInterface(session_store)
+
+def regenerate_session():
+    """Give the session a fresh id, e.g. at login, so a pre-login id cannot be reused"""
+    if not session.new:
+        session_store.delete(session.sid)
+    session.sid = secrets.token_urlsafe(32)
+    session.modified = True
+
+def get_current_user():
+    """The logged-in user's row, loaded at most once per request"""
+    if 'current_user' not in g:
+        g.current_user = None
+        if 'user_id' in session:
+            g.current_user = get_db_connection().execute(
+                'SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    return g.current_user
+
+# Product search helpers
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+def build_fts_query(search):
+    """Turn free text into an FTS5 query that prefix-matches every word"""
+    words = re.findall(r'\w+', search)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def render_snippet(snippet):
+    """Escape an FTS5 snippet and turn its match markers into <mark> tags"""
+    return Markup(str(escape(snippet)).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+# Pagination helpers
+# List pages use keyset (cursor) pagination: the cursor carries the sort key and id of the
+# last row shown, so each page is an index range scan no matter how deep it is.
+def get_page_size(config_key):
+    page_size = request.args.get('per_page', type=int) or app.config[config_key]
+    return max(1, min(page_size, app.config['MAX_PAGE_SIZE']))
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Decode an ?after= cursor; returns None when missing or malformed"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    return values if isinstance(values, list) else None
+
+# Keyset-paginated list pages: (select, conditions, sort column, id column). The routes and
+# check-query-plans both build their SQL from here.
+KEYSET_PAGES = {
+    'products': ('SELECT p.* FROM products p', ['p.stock_quantity > 0'], 'p.created_at', 'p.id'),
+    'admin_products': ('''
+        SELECT p.*, c.name as category_name 
+        FROM products p 
+        LEFT JOIN categories c ON p.category_id = c.id
+    ''', [], 'p.created_at', 'p.id'),
+    'admin_orders': ('''
+        SELECT o.*, u.first_name, u.last_name, u.email 
+        FROM orders o 
+        JOIN users u ON o.customer_id = u.id
+    ''', [], 'o.order_date', 'o.id'),
+    'admin_customers': ('SELECT * FROM users', ["role = 'customer'"], 'created_at', 'id'),
+    'admin_walkin_sales': ('''
+        SELECT ws.*, u.first_name, u.last_name
+        FROM walkin_sales ws
+        LEFT JOIN users u ON ws.admin_id = u.id
+    ''', [], 'ws.sale_date', 'ws.id'),
+}
+
+def keyset_query(page, conditions=(), after=False):
+    """SQL for one page of a KEYSET_PAGES list, newest first; after adds the cursor bound"""
+    select, base_conditions, sort_column, id_column = KEYSET_PAGES[page]
+    conditions = base_conditions + list(conditions)
+    if after:
+        conditions.append(f'({sort_column}, {id_column}) < (?, ?)')
+    query = select
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query + f' ORDER BY {sort_column} DESC, {id_column} DESC LIMIT ?'
+
+def fetch_keyset_page(conn, page, page_size, conditions=(), params=()):
+    """Fetch one page of a KEYSET_PAGES list, with optional extra conditions.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    params = list(params)
+    after = decode_cursor(request.args.get('after'))
+    after = after if after and len(after) == 2 else None
+    if after:
+        params.extend(after)
+    query = keyset_query(page, conditions, after=bool(after))
+    rows = conn.execute(query, params + [page_size + 1]).fetchall()
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        _, _, sort_column, id_column = KEYSET_PAGES[page]
+        sort_key, id_key = sort_column.split('.')[-1], id_column.split('.')[-1]
+        next_cursor = encode_cursor(rows[-1][sort_key], rows[-1][id_key])
+    return rows, next_cursor
+
+def wants_json():
+    return request.args.get('format') == 'json'
+
+def page_json(rows, next_cursor):
+    """JSON variant of a list page, for loading tables incrementally"""
+    items = []
+    for row in rows:
+        item = dict(row)
+        item.pop('password', None)
+        items.append(item)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+# Table write versions
+# Routes and CLI commands call tables_changed() after committing a write. The counters live
+# in the table_versions table, so a write in one worker or a CLI process invalidates the
+# in-process caches of every worker; caches remember the versions they were built from and
+# treat any bump as an invalidation. A request reads the counters once.
+def tables_changed(*tables):
+    # Its own pooled connection, so the bump never commits a view's open transaction
+    conn = db_pool.acquire()
+    try:
+        conn.executemany('''
+            INSERT INTO table_versions (name, version) VALUES (?, 1)
+            ON CONFLICT (name) DO UPDATE SET version = version + 1
+        ''', [(table,) for table in set(tables)])
+        conn.commit()
+    finally:
+        db_pool.release(conn)
+    if has_request_context():
+        g.pop('table_versions', None)
+
+def get_table_versions(*tables):
+    if has_request_context() and 'table_versions' in g:
+        versions = g.table_versions
+    else:
+        conn = db_pool.acquire()
+        try:
+            versions = dict(conn.execute('SELECT name, version FROM table_versions').fetchall())
+        finally:
+            db_pool.release(conn)
+        if has_request_context():
+            g.table_versions = versions
+    return tuple(versions.get(table, 0) for table in tables)
+
+# Admin dashboard statistics
+DASHBOARD_TABLES = ('orders', 'products', 'users')
+dashboard_cache = {'payload': None, 'expires': 0, 'versions': None}
+dashboard_cache_lock = threading.Lock()
+
+DASHBOARD_TOTALS_QUERY = '''
+    SELECT (SELECT COUNT(*) FROM products) as total_products,
+           (SELECT COUNT(*) FROM orders) as total_orders,
+           (SELECT COUNT(*) FROM users WHERE role = 'customer') as total_customers,
+           (SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE status = 'completed') as total_revenue,
+           (SELECT COUNT(*) FROM products WHERE stock_quantity < 10) as low_stock_count
+'''
+DASHBOARD_RECENT_ORDERS_QUERY = '''
+    SELECT o.id, o.order_number, o.total_amount, o.status, o.order_date, u.first_name, u.last_name 
+    FROM orders o 
+    JOIN users u ON o.customer_id = u.id 
+    ORDER BY o.order_date DESC 
+    LIMIT 10
+'''
+DASHBOARD_LOW_STOCK_QUERY = '''
+    SELECT id, name, brand, model, stock_quantity, image FROM products WHERE stock_quantity < 10
+    ORDER BY stock_quantity ASC
+    LIMIT 20
+'''
+
+def compute_dashboard_stats(conn):
+    """Compute every dashboard KPI in one statement plus the two short lists"""
+    totals = conn.execute(DASHBOARD_TOTALS_QUERY).fetchone()
+    recent_orders = conn.execute(DASHBOARD_RECENT_ORDERS_QUERY).fetchall()
+    low_stock = conn.execute(DASHBOARD_LOW_STOCK_QUERY).fetchall()
+    
+    stats = dict(totals)
+    stats['recent_orders'] = [dict(row) for row in recent_orders]
+    stats['low_stock'] = [dict(row) for row in low_stock]
+    stats['generated_at'] = datetime.now().isoformat()
+    return stats
+
+def get_dashboard_stats():
+    """Dashboard KPIs, cached per process for DASHBOARD_CACHE_TTL seconds or until a write"""
+    versions = get_table_versions(*DASHBOARD_TABLES)
+    with dashboard_cache_lock:
+        if (dashboard_cache['payload'] is not None and dashboard_cache['versions'] == versions
+                and time.monotonic() < dashboard_cache['expires']):
+            return dashboard_cache['payload']
+    
+    conn = get_db_connection()
+    stats = compute_dashboard_stats(conn)
+    conn.close()
+    
+    with dashboard_cache_lock:
+        dashboard_cache.update(payload=stats, versions=versions,
+                               expires=time.monotonic() + app.config['DASHBOARD_CACHE_TTL'])
+    return stats
+
+# Image upload pipeline
+def generate_image_variants(filename):
+    """Write resized, EXIF-free WebP and JPEG copies of an upload.
+
+    Returns (variant, format, width, height, path) rows; empty when Pillow is
+    unavailable or the file can't be decoded.
+    """
+    if Image is None:
+        return []
+    # Keep the extension in the name so part.jpg and part.png don't overwrite each other's variants
+    stem = os.path.basename(filename).replace('.', '_')
+    rows = []
+    try:
+        with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], filename)) as original:
+            # Apply the EXIF orientation, since the metadata itself is not copied over
+            source = ImageOps.exif_transpose(original)
+            has_alpha = source.mode in ('RGBA', 'LA') or 'transparency' in source.info
+            source = source.convert('RGBA' if has_alpha else 'RGB')
+            
+            widths_done = set()
+            for variant, max_width in IMAGE_VARIANTS.items():
+                width = min(max_width, source.width)
+                if width in widths_done:
+                    continue  # never upscale; small originals get fewer variants
+                widths_done.add(width)
+                height = max(1, round(source.height * width / source.width))
+                resized = source.resize((width, height), Image.LANCZOS) if width != source.width else source
+                
+                for fmt, (pil_format, options) in IMAGE_VARIANT_FORMATS.items():
+                    image = resized
+                    if pil_format == 'JPEG' and image.mode == 'RGBA':
+                        background = Image.new('RGB', image.size, (255, 255, 255))
+                        background.paste(image, mask=image.getchannel('A'))
+                        image = background
+                    path = f"uploads/variants/{stem}_{variant}.{fmt}"
+                    image.save(os.path.join(app.static_folder, path), pil_format, **options)
+                    rows.append((variant, fmt, width, height, path))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Could not generate variants for {filename}: {e}")
+        return []
+    return rows
+
+def record_image_variants(conn, filename):
+    """Generate the variants of an upload and record them in image_variants"""
+    rows = generate_image_variants(filename)
+    if rows:
+        created_at = datetime.now().isoformat()
+        conn.executemany('''
+            INSERT OR REPLACE INTO image_variants (image, variant, format, width, height, path, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(filename,) + row + (created_at,) for row in rows])
+    return rows
+
+def remove_image_variants(conn, filename):
+    """Delete the variant files and rows of an upload (the caller commits)"""
+    for row in conn.execute('SELECT path FROM image_variants WHERE image = ?', (filename,)).fetchall():
+        try:
+            os.remove(os.path.join(app.static_folder, row['path']))
+        except OSError:
+            pass
+    conn.execute('DELETE FROM image_variants WHERE image = ?', (filename,))
+
+def store_blob(conn, stream, extension):
+    """Store a file's bytes once under their sha256; returns (path, is_new).
+
+    path is relative to the upload folder. The caller commits.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=BLOB_FOLDER, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in iter(lambda: stream.read(65536), b''):
+                digest.update(chunk)
+                size += len(chunk)
+                temp_file.write(chunk)
+        
+        content_hash = digest.hexdigest()
+        now = datetime.now().isoformat()
+        # Marking the blob seen takes the write lock first, so gc-uploads either sees the fresh
+        # last_seen_at or has already deleted the row and file
+        existing = None
+        if conn.execute('UPDATE upload_blobs SET last_seen_at = ? WHERE hash = ?', (now, content_hash)).rowcount:
+            existing = conn.execute('SELECT path FROM upload_blobs WHERE hash = ?', (content_hash,)).fetchone()
+        if existing and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], existing['path'])):
+            return existing['path'], False
+        
+        path = existing['path'] if existing else f"blobs/{content_hash[:2]}/{content_hash}.{extension}"
+        full_path = os.path.join(app.config['UPLOAD_FOLDER'], path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(temp_path, full_path)
+        conn.execute('''
+            INSERT OR IGNORE INTO upload_blobs (hash, path, size, created_at, last_seen_at) VALUES (?, ?, ?, ?, ?)
+        ''', (content_hash, path, size, now, now))
+        return path, True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+variant_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+def build_variants_in_background(path):
+    """Variant job for variant_executor; pages fall back to the original until it finishes"""
+    conn = db_pool.acquire()
+    try:
+        record_image_variants(conn, path)
+        conn.commit()
+    except Exception as e:
+        print(f"Could not build variants for {path}: {e}")
+    finally:
+        db_pool.release(conn)
+    tables_changed('image_variants')
+
+def save_upload(file):
+    """Store an uploaded image by content and build its variants; returns the path to save on the row"""
+    extension = secure_filename(file.filename).rsplit('.', 1)[-1].lower()
+    conn = get_db_connection()
+    path, is_new = store_blob(conn, file.stream, extension)
+    # Identical bytes were uploaded before: reuse the blob and its variants
+    if is_new and not app.config['BACKGROUND_IMAGE_VARIANTS']:
+        record_image_variants(conn, path)
+    conn.commit()
+    tables_changed('image_variants')
+    conn.close()
+    if is_new and app.config['BACKGROUND_IMAGE_VARIANTS']:
+        variant_executor.submit(build_variants_in_background, path)
+    return path
+
+UNREFERENCED_BLOBS = '''
+    b.last_seen_at < ? AND NOT EXISTS (SELECT 1 FROM upload_refs r WHERE r.image = b.path)
+'''
+
+def find_unreferenced_blobs(conn, grace_seconds):
+    """Blobs no owner row points at, not uploaded within grace_seconds (so in-flight uploads survive)"""
+    cutoff = datetime.fromtimestamp(time.time() - grace_seconds).isoformat()
+    return conn.execute(
+        f'SELECT b.hash, b.path, b.size FROM upload_blobs b WHERE {UNREFERENCED_BLOBS}', (cutoff,)
+    ).fetchall()
+
+image_variant_cache = {'versions': None, 'variants': {}}
+image_variant_cache_lock = threading.Lock()
+
+@app.template_global()
+def upload_variants(image):
+    """srcset strings for an upload's variants, e.g. {'webp': ..., 'jpeg': ..., 'src': ...}"""
+    if not image:
+        return None
+    versions = get_table_versions('image_variants')
+    with image_variant_cache_lock:
+        if image_variant_cache['versions'] != versions:
+            image_variant_cache['versions'] = None
+    if image_variant_cache['versions'] is None:
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT image, variant, format, width, path FROM image_variants ORDER BY image, width
+        ''').fetchall()
+        conn.close()
+        variants = {}
+        for row in rows:
+            entry = variants.setdefault(row['image'], {'webp': [], 'jpeg': [], 'src': None})
+            url = url_for('static', filename=row['path'])
+            entry[row['format']].append(f"{url} {row['width']}w")
+            if row['format'] == 'jpeg' and (entry['src'] is None or row['variant'] == 'card'):
+                entry['src'] = url
+        with image_variant_cache_lock:
+            image_variant_cache.update(versions=versions, variants={
+                name: {'webp': ', '.join(entry['webp']), 'jpeg': ', '.join(entry['jpeg']), 'src': entry['src']}
+                for name, entry in variants.items()
+            })
+    return image_variant_cache['variants'].get(image)
 
 def is_logged_in():
     return 'user_id' in session
@@ -379,45 +1529,598 @@ def is_logged_in():
 def is_admin():
     return session.get('role') == 'admin'
 
-def generate_order_number():
-    return f"TECH13-{datetime.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
+def next_document_number(conn, prefix):
+    """PREFIX-YYYYMMDD-NNNNNN from a per-day counter.
 
-def generate_sale_number():
-    return f"WALKIN-{datetime.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
+    Must run inside the caller's write transaction: the upsert takes SQLite's write lock, so
+    workers are serialised and a rolled-back order or sale also gives its number back.
+    Zero padding keeps the numbers in issue order in the unique indexes.
+    """
+    day = datetime.now().strftime('%Y%m%d')
+    value = conn.execute('''
+        INSERT INTO document_sequences (prefix, day, last_value) VALUES (?, ?, 1)
+        ON CONFLICT (prefix, day) DO UPDATE SET last_value = last_value + 1
+        RETURNING last_value
+    ''', (prefix, day)).fetchone()[0]
+    return f"{prefix}-{day}-{value:06d}"
 
-def record_inventory_transaction(product_id, transaction_type, quantity, order_id=None, customer_id=None, admin_id=None, notes="", unit_price=0, total_amount=0):
-    """Record inventory transaction"""
-    conn = get_db_connection()
-    conn.execute('''
+def generate_order_number(conn):
+    return next_document_number(conn, 'TECH13')
+
+def generate_sale_number(conn):
+    return next_document_number(conn, 'WALKIN')
+
+def record_inventory_transactions(conn, transactions):
+    """Insert a batch of inventory transactions on the caller's connection.
+
+    Each entry is a (product_id, transaction_type, quantity, order_id, customer_id,
+    admin_id, notes, unit_price, total_amount) tuple. The caller commits, so the
+    ledger rows land in the same transaction as the stock change they describe.
+    """
+    transactions = list(transactions)
+    transaction_date = datetime.now().isoformat()
+    conn.executemany('''
         INSERT INTO inventory_transactions 
         (product_id, transaction_type, quantity, order_id, customer_id, admin_id, notes, transaction_date, unit_price, total_amount)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (product_id, transaction_type, quantity, order_id, customer_id, admin_id, notes, datetime.now().isoformat(), unit_price, total_amount))
-    conn.commit()
-    conn.close()
+    ''', [(product_id, transaction_type, quantity, order_id, customer_id, admin_id, notes, transaction_date, unit_price, total_amount)
+          for product_id, transaction_type, quantity, order_id, customer_id, admin_id, notes, unit_price, total_amount in transactions])
+    update_inventory_stats(conn, [(row[0], row[1], row[2]) for row in transactions])
+    take_inventory_snapshots(conn, {row[0] for row in transactions}, app.config['INVENTORY_SNAPSHOT_INTERVAL'])
 
-def update_product_stock(product_id, quantity_change):
-    """Update product stock quantity"""
-    conn = get_db_connection()
+# Inventory stats counters
+# product_inventory_stats is updated in the same transaction as every ledger insert, so the
+# inventory page reads one row per product instead of aggregating the whole ledger.
+INVENTORY_STATS_COLUMNS = {
+    'sale': 'total_sold',
+    'walkin': 'total_walkin',
+    'restock': 'total_restock',
+    'return': 'total_returned',
+}
+
+def inventory_stats_delta(transaction_type, quantity):
+    """Return (sold, walkin, restock, returned, adjustment) increments for one ledger row"""
+    column = INVENTORY_STATS_COLUMNS.get(transaction_type)
+    return (
+        abs(quantity) if column == 'total_sold' else 0,
+        abs(quantity) if column == 'total_walkin' else 0,
+        abs(quantity) if column == 'total_restock' else 0,
+        abs(quantity) if column == 'total_returned' else 0,
+        quantity if transaction_type == 'adjustment' else 0,
+    )
+
+def update_inventory_stats(conn, movements):
+    """Apply (product_id, transaction_type, quantity) movements to product_inventory_stats"""
+    updated_at = datetime.now().isoformat()
+    conn.executemany('''
+        INSERT INTO product_inventory_stats
+        (product_id, total_sold, total_walkin, total_restock, total_returned, net_adjustment, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (product_id) DO UPDATE SET
+            total_sold = total_sold + excluded.total_sold,
+            total_walkin = total_walkin + excluded.total_walkin,
+            total_restock = total_restock + excluded.total_restock,
+            total_returned = total_returned + excluded.total_returned,
+            net_adjustment = net_adjustment + excluded.net_adjustment,
+            updated_at = excluded.updated_at
+    ''', [(product_id,) + inventory_stats_delta(transaction_type, quantity) + (updated_at,)
+          for product_id, transaction_type, quantity in movements])
+
+INVENTORY_STATS_FROM_LEDGER = '''
+    SELECT product_id,
+           SUM(CASE WHEN transaction_type = 'sale' THEN ABS(quantity) ELSE 0 END) as total_sold,
+           SUM(CASE WHEN transaction_type = 'walkin' THEN ABS(quantity) ELSE 0 END) as total_walkin,
+           SUM(CASE WHEN transaction_type = 'restock' THEN ABS(quantity) ELSE 0 END) as total_restock,
+           SUM(CASE WHEN transaction_type = 'return' THEN ABS(quantity) ELSE 0 END) as total_returned,
+           SUM(CASE WHEN transaction_type = 'adjustment' THEN quantity ELSE 0 END) as net_adjustment
+    FROM inventory_transactions
+    WHERE product_id IN (SELECT id FROM products)
+    GROUP BY product_id
+'''
+
+def rebuild_inventory_stats(conn):
+    """Recompute product_inventory_stats from the ledger. Returns the product ids that had drifted."""
+    stats_columns = ('total_sold', 'total_walkin', 'total_restock', 'total_returned', 'net_adjustment')
+    current = {row[0]: tuple(row[1:]) for row in conn.execute(
+        'SELECT product_id, ' + ', '.join(stats_columns) + ' FROM product_inventory_stats'
+    ).fetchall()}
+    expected = {row[0]: tuple(row[1:]) for row in conn.execute(INVENTORY_STATS_FROM_LEDGER).fetchall()}
+    drifted = sorted(product_id for product_id in set(current) | set(expected)
+                     if current.get(product_id) != expected.get(product_id))
+    
+    conn.execute('DELETE FROM product_inventory_stats')
     conn.execute('''
-        UPDATE products SET stock_quantity = stock_quantity + ? WHERE id = ?
-    ''', (quantity_change, product_id))
-    conn.commit()
-    conn.close()
+        INSERT INTO product_inventory_stats
+        (product_id, total_sold, total_walkin, total_restock, total_returned, net_adjustment, updated_at)
+        SELECT ledger.*, ? FROM (''' + INVENTORY_STATS_FROM_LEDGER + ''') ledger
+    ''', (datetime.now().isoformat(),))
+    return drifted
+
+def record_inventory_transaction(product_id, transaction_type, quantity, order_id=None, customer_id=None, admin_id=None, notes="", unit_price=0, total_amount=0, conn=None):
+    """Record inventory transaction (uncommitted, on the request connection by default)"""
+    record_inventory_transactions(conn or get_db_connection(), [
+        (product_id, transaction_type, quantity, order_id, customer_id, admin_id, notes, unit_price, total_amount)
+    ])
+
+# Ledger stock snapshots
+# inventory_transactions is the source of truth for stock; products.stock_quantity is the
+# running total kept in the same transactions for the storefront filters. A snapshot stores
+# a product's stock up to a ledger row, so stock at any time is the latest snapshot at or
+# before it plus the few ledger rows after it, never the whole history.
+def take_inventory_snapshots(conn, product_ids=None, min_tail=1):
+    """Snapshot products with at least min_tail ledger rows since their last snapshot (the caller commits)"""
+    product_filter = ''
+    params = [datetime.now().isoformat()]
+    if product_ids is not None:
+        product_ids = [product_id for product_id in product_ids if product_id is not None]
+        if not product_ids:
+            return 0
+        product_filter = f"AND t.product_id IN ({', '.join('?' * len(product_ids))})"
+        params.extend(product_ids)
+    params.append(min_tail)
+    cursor = conn.execute(f'''
+        INSERT INTO inventory_snapshots (product_id, ledger_id, stock, as_of, taken_at)
+        SELECT t.product_id, MAX(t.id), COALESCE(s.stock, 0) + SUM(t.quantity),
+               max(COALESCE(s.as_of, ''), MAX(t.transaction_date)), ?
+        FROM inventory_transactions t
+        LEFT JOIN inventory_snapshots s ON s.product_id = t.product_id AND s.ledger_id = (
+            SELECT MAX(ledger_id) FROM inventory_snapshots WHERE product_id = t.product_id)
+        WHERE t.id > COALESCE(s.ledger_id, 0) AND t.product_id IN (SELECT id FROM products) {product_filter}
+        GROUP BY t.product_id
+        HAVING COUNT(*) >= ?
+    ''', params)
+    return cursor.rowcount
+
+def ledger_stock(conn, as_of=None):
+    """{product_id: stock} from snapshots plus ledger tails, now or at an ISO timestamp"""
+    as_of = as_of or '9999'
+    rows = conn.execute('''
+        SELECT base.id,
+               COALESCE((SELECT stock FROM inventory_snapshots
+                         WHERE product_id = base.id AND ledger_id = base.ledger_id), 0)
+               + COALESCE((SELECT SUM(quantity) FROM inventory_transactions
+                           WHERE product_id = base.id AND id > COALESCE(base.ledger_id, 0)
+                             AND transaction_date <= ?), 0) as stock
+        FROM (
+            SELECT p.id, (SELECT ledger_id FROM inventory_snapshots s
+                          WHERE s.product_id = p.id AND s.as_of <= ?
+                          ORDER BY ledger_id DESC LIMIT 1) as ledger_id
+            FROM products p
+        ) base
+    ''', (as_of, as_of)).fetchall()
+    return {row['id']: row['stock'] for row in rows}
+
+# Sales rollups
+# sales_rollups holds units, revenue and document counts per period, channel and dimension.
+# Each order or walk-in sale is added in the transaction that writes it (and taken out again
+# if an order is cancelled), so the analytics page reads a few hundred rollup rows instead of
+# aggregating every order line.
+ROLLUP_PERIODS = ('day', 'week', 'month')
+ROLLUP_EXCLUDED_STATUSES = ('cancelled',)
+SALES_ROLLUP_LINES = {
+    'online': ('''
+        SELECT o.id as document_id, o.order_date as sold_at, 'online' as payment_method,
+               oi.item_type, COALESCE(oi.product_id, oi.service_id) as item_id, p.category_id,
+               oi.quantity, oi.quantity * oi.price as revenue
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        LEFT JOIN products p ON p.id = oi.product_id
+    ''', 'o'),
+    'walkin': ('''
+        SELECT ws.id as document_id, ws.sale_date as sold_at, ws.payment_method,
+               'product' as item_type, wsi.product_id as item_id, p.category_id,
+               wsi.quantity, wsi.total_price as revenue
+        FROM walkin_sales ws
+        JOIN walkin_sale_items wsi ON wsi.walkin_sale_id = ws.id
+        LEFT JOIN products p ON p.id = wsi.product_id
+    ''', 'ws'),
+}
+
+def rollup_period_start(period, day):
+    """First day (a date) of the day, week or month containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def sales_rollup_deltas(channel, lines, sign=1, deltas=None):
+    """Fold sale lines, grouped by document, into {rollup key: [units, revenue, documents]}"""
+    deltas = {} if deltas is None else deltas
+    for _, document_lines in groupby(lines, key=lambda line: line['document_id']):
+        document_lines = list(document_lines)
+        if not document_lines[0]['sold_at']:
+            continue
+        day = datetime.fromisoformat(document_lines[0]['sold_at']).date()
+        periods = [(period, rollup_period_start(period, day).isoformat()) for period in ROLLUP_PERIODS]
+        document_keys = set()
+        for line in document_lines:
+            dimensions = [('total', ''), ('payment_method', line['payment_method'] or ''),
+                          (line['item_type'], str(line['item_id'] or ''))]
+            if line['item_type'] == 'product':
+                dimensions.append(('category', str(line['category_id'] or '')))
+            for period, period_start in periods:
+                for dimension, dimension_key in dimensions:
+                    key = (period, dimension, period_start, channel, dimension_key)
+                    entry = deltas.setdefault(key, [0, 0.0, 0])
+                    entry[0] += sign * (line['quantity'] or 0)
+                    entry[1] += sign * (line['revenue'] or 0)
+                    document_keys.add(key)
+        for key in document_keys:
+            deltas[key][2] += sign
+    return deltas
+
+def apply_sales_rollup_deltas(conn, deltas):
+    conn.executemany('''
+        INSERT INTO sales_rollups (period, dimension, period_start, channel, dimension_key, units, revenue, documents)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (period, dimension, period_start, channel, dimension_key) DO UPDATE SET
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue,
+            documents = documents + excluded.documents
+    ''', [key + tuple(values) for key, values in deltas.items()])
 
-# Initialize database on app startup
-init_db()
+def rollup_sale(conn, channel, document_id, sign=1):
+    """Add (or with sign=-1 remove) one order or walk-in sale in the rollups; the caller commits"""
+    query, alias = SALES_ROLLUP_LINES[channel]
+    lines = conn.execute(f'{query} WHERE {alias}.id = ?', (document_id,)).fetchall()
+    apply_sales_rollup_deltas(conn, sales_rollup_deltas(channel, lines, sign))
+
+def rebuild_sales_rollups(conn):
+    """Recompute sales_rollups from orders and walk-in sales. Returns the number of rows that changed."""
+    deltas = {}
+    for channel, (query, alias) in SALES_ROLLUP_LINES.items():
+        where = (f"WHERE o.status NOT IN ({', '.join('?' * len(ROLLUP_EXCLUDED_STATUSES))})"
+                 if channel == 'online' else '')
+        params = ROLLUP_EXCLUDED_STATUSES if channel == 'online' else ()
+        # The cursor streams lines in document order, so only the deltas are held in memory
+        sales_rollup_deltas(channel, conn.execute(f'{query} {where} ORDER BY {alias}.id', params), deltas=deltas)
+    
+    # Rows emptied by cancellations count as missing
+    current = {tuple(row[:5]): (row[5], round(row[6], 2), row[7]) for row in conn.execute('''
+        SELECT period, dimension, period_start, channel, dimension_key, units, revenue, documents FROM sales_rollups
+        WHERE units != 0 OR documents != 0 OR ROUND(revenue, 2) != 0
+    ''').fetchall()}
+    expected = {key: (values[0], round(values[1], 2), values[2]) for key, values in deltas.items()}
+    changed = sum(1 for key in set(current) | set(expected) if current.get(key) != expected.get(key))
+    
+    conn.execute('DELETE FROM sales_rollups')
+    apply_sales_rollup_deltas(conn, deltas)
+    return changed
+
+def create_walkin_sale(conn, quantities, customer_name, customer_phone, payment_method, admin_id, notes=''):
+    """Price, stock-check and record a walk-in sale in a single transaction.
+
+    quantities maps product_id -> quantity. Returns (sale_number, sale_items, skipped):
+    skipped holds the product ids that are unknown or short on stock, and sale_number
+    is None when nothing could be sold.
+    """
+    # Take the write lock up front so prices and stock can't change under us
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        placeholders = ', '.join('?' * len(quantities))
+        products = {
+            product['id']: product for product in conn.execute(f'''
+                SELECT id, name, price, stock_quantity FROM products WHERE id IN ({placeholders})
+            ''', list(quantities)).fetchall()
+        }
+        
+        sale_items = []
+        skipped = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if not product or product['stock_quantity'] < quantity:
+                skipped.append(product_id)
+                continue
+            unit_price = product['price'] or 0
+            sale_items.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_price': unit_price * quantity,
+                'product_name': product['name']
+            })
+        
+        if not sale_items:
+            conn.rollback()
+            return None, [], skipped
+        
+        total_amount = sum(item['total_price'] for item in sale_items)
+        cursor = conn.cursor()
+        sale_number = generate_sale_number(cursor)
+        sale_date = datetime.now().isoformat()
+        cursor.execute('''
+            INSERT INTO walkin_sales (sale_number, customer_name, customer_phone, total_amount, payment_method, admin_id, sale_date, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (sale_number, customer_name, customer_phone, total_amount, payment_method, admin_id, sale_date, notes))
+        sale_id = cursor.lastrowid
+        
+        # Conditional decrement: a line that would oversell updates no row
+        cursor.executemany('''
+            UPDATE products SET stock_quantity = stock_quantity - ?, updated_at = ?
+            WHERE id = ? AND stock_quantity >= ?
+        ''', [(item['quantity'], sale_date, item['product_id'], item['quantity']) for item in sale_items])
+        if cursor.rowcount != len(sale_items):
+            conn.rollback()
+            return None, [], list(quantities)
+        
+        cursor.executemany('''
+            INSERT INTO walkin_sale_items (walkin_sale_id, product_id, quantity, unit_price, total_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(sale_id, item['product_id'], item['quantity'], item['unit_price'], item['total_price'])
+              for item in sale_items])
+        
+        record_inventory_transactions(cursor, [
+            (item['product_id'], 'walkin', -item['quantity'], None, None, admin_id,
+             f"Walk-in sale {sale_number}", item['unit_price'], item['total_price'])
+            for item in sale_items
+        ])
+        rollup_sale(cursor, 'walkin', sale_id)
+        
+        conn.commit()
+        tables_changed('products', 'walkin_sales', 'inventory_transactions', 'sales_rollups')
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return sale_number, sale_items, skipped
+
+# Rendered page cache
+# Public catalog pages are cached as rendered HTML for anonymous visitors. The key includes
+# the versions of the tables a page reads, so a tables_changed() bump simply makes the old
+# entries unreachable and the LRU ages them out.
+class PageCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'max_entries': self.max_entries,
+                'entries': len(self._entries),
+                'bytes': sum(len(body) for body, _ in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+page_cache = PageCache(app.config['PAGE_CACHE_SIZE'])
+
+def cached_page(*tables):
+    """Serve a GET view from page_cache for anonymous visitors until one of tables changes"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # Logged-in pages show the user's menu and pending flashes are one-shot; render those
+            if request.method != 'GET' or session.get('user_id') or '_flashes' in session:
+                return view(**kwargs)
+            
+            key = (request.endpoint,
+                   tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))),
+                   get_table_versions(*tables))
+            entry = page_cache.get(key)
+            if entry is not None:
+                body, mimetype = entry
+                return app.response_class(body, mimetype=mimetype)
+            
+            response = app.make_response(view(**kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and '_flashes' not in session:
+                page_cache.set(key, (response.get_data(), response.mimetype))
+            return response
+        return wrapper
+    return decorator
+
+# Conditional responses for catalog pages
+# The validator combines the rows themselves (row count and newest updated_at) with the
+# shared table_versions counters of the tables and of image_variants, so it is the same in
+# every worker and also changes on writes that leave updated_at alone (migrate-uploads
+# rewriting image paths, variants finishing in the background).
+CATALOG_VALIDATOR_COLUMNS = {
+    'products': 'updated_at',
+    'services': 'updated_at',
+    'categories': 'updated_at',
+    'reviews': 'created_at',
+}
+
+catalog_validator_cache = {}  # tables -> (table versions, validator row)
+
+def catalog_validators(tables):
+    """Weak ETag and Last-Modified datetime for the current contents of tables"""
+    # The row is remembered until any process writes to one of the tables
+    versions = get_table_versions(*tables, 'image_variants')
+    cached = catalog_validator_cache.get(tables)
+    if cached and cached[0] == versions:
+        row = cached[1]
+    else:
+        selects = ', '.join(
+            f"(SELECT COUNT(*) FROM {table}), (SELECT MAX({CATALOG_VALIDATOR_COLUMNS[table]}) FROM {table})"
+            for table in tables)
+        row = tuple(get_db_connection().execute(f'SELECT {selects}').fetchone())
+        catalog_validator_cache[tables] = (versions, row)
+    
+    timestamps = [value for value in row[1::2] if value]
+    last_modified = None
+    if timestamps:
+        try:
+            last_modified = datetime.fromisoformat(max(timestamps)).astimezone(timezone.utc).replace(microsecond=0)
+        except ValueError:
+            pass
+    
+    # The same URL renders differently per viewer (menus, add-to-cart buttons)
+    viewer = (session.get('user_id'), session.get('role'), session.get('first_name'))
+    fingerprint = json.dumps([app.config.get('ASSET_BUILD_ID'), viewer, row, versions], default=str)
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:24], last_modified
+
+def conditional_page(*tables):
+    """Answer GETs with 304 when the client's copy is still current, before the view runs"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return view(**kwargs)
+            
+            etag, last_modified = catalog_validators(tables)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since)
+            
+            if not_modified:
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+# Static asset fingerprinting
+# url_for('static') is rewritten to a content-hashed filename (css/style.<hash>.css) so
+# those URLs can be cached for a year and a deploy changes the URL instead of the bytes.
+asset_manifest = {}  # real filename -> fingerprinted filename
+asset_sources = {}  # fingerprinted filename -> real filename
+
+def fingerprinted_name(filename, content_hash):
+    base, extension = os.path.splitext(filename)
+    return f"{base}.{content_hash}{extension}"
+
+def precompress_asset(full_path):
+    """Write .gz (and .br when brotli is installed) siblings next to a text asset"""
+    with open(full_path, 'rb') as source:
+        data = source.read()
+    siblings = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        siblings.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in siblings:
+        target = full_path + suffix
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(full_path):
+            with open(target, 'wb') as compressed:
+                compressed.write(compress())
+
+def build_asset_manifest():
+    """Hash every static file except uploads, which change at runtime"""
+    manifest = {}
+    for root, dirs, files in os.walk(app.static_folder):
+        relative_root = os.path.relpath(root, app.static_folder).replace(os.sep, '/')
+        if relative_root == 'uploads' or relative_root.startswith('uploads/'):
+            dirs[:] = []
+            continue
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            full_path = os.path.join(root, name)
+            filename = name if relative_root == '.' else f"{relative_root}/{name}"
+            with open(full_path, 'rb') as asset:
+                content_hash = hashlib.sha256(asset.read()).hexdigest()[:12]
+            manifest[filename] = fingerprinted_name(filename, content_hash)
+            if name.lower().endswith(COMPRESSIBLE_ASSET_TYPES):
+                try:
+                    precompress_asset(full_path)
+                except OSError as e:
+                    print(f"Could not precompress {filename}: {e}")
+    asset_manifest.clear()
+    asset_manifest.update(manifest)
+    
+    # Changes to templates or assets must change catalog ETags even when the data did not
+    build_hash = hashlib.sha256(json.dumps(sorted(manifest.items())).encode())
+    for root, dirs, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as template:
+                build_hash.update(template.read())
+    app.config['ASSET_BUILD_ID'] = build_hash.hexdigest()[:12]
+    asset_sources.clear()
+    asset_sources.update({hashed: filename for filename, hashed in manifest.items()})
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and app.config['ASSET_FINGERPRINTS']:
+        filename = values.get('filename')
+        if filename in asset_manifest:
+            values['filename'] = asset_manifest[filename]
+
+def serve_static_asset(filename):
+    """Static view: fingerprinted and content-addressed files are immutable, the rest revalidate"""
+    source = asset_sources.get(filename)
+    immutable = source is not None or filename.startswith('uploads/blobs/')
+    source = source or filename
+    
+    response = None
+    if source.lower().endswith(COMPRESSIBLE_ASSET_TYPES):
+        mimetype = mimetypes.guess_type(source)[0]
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in request.accept_encodings and os.path.isfile(os.path.join(app.static_folder, source + suffix)):
+                response = send_from_directory(app.static_folder, source + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, source)
+        response.vary.add('Accept-Encoding')
+    else:
+        response = send_from_directory(app.static_folder, source)
+    
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+app.view_functions['static'] = serve_static_asset
+
+# Initialize database on app startup, unless the launcher already migrated it in a
+# separate process (serve.py) so that server workers never race on schema changes
+if os.environ.get('TECH13_SKIP_INIT_DB') != '1':
+    init_db()
+build_asset_manifest()
 
 # Routes
+FEATURED_PRODUCTS_QUERY = '''
+    SELECT * FROM products WHERE stock_quantity > 0 
+    ORDER BY created_at DESC LIMIT 8
+'''
+
 @app.route('/')
+@cached_page('products', 'categories', 'services', 'awards', 'image_variants')
 def index():
     conn = get_db_connection()
     
     # Get featured products
-    featured_products = conn.execute('''
-        SELECT * FROM products WHERE stock_quantity > 0 
-        ORDER BY created_at DESC LIMIT 8
-    ''').fetchall()
+    featured_products = conn.execute(FEATURED_PRODUCTS_QUERY).fetchall()
     
     # Get categories
     categories = conn.execute('SELECT * FROM categories').fetchall()
@@ -453,6 +2156,7 @@ def login():
         conn.close()
         
         if user and check_password_hash(user['password'], password):
+            regenerate_session()
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
@@ -498,6 +2202,7 @@ def register():
         ''', (username, email, hashed_password, first_name, last_name, phone, address, datetime.now().isoformat()))
         
         conn.commit()
+        tables_changed('users')
         conn.close()
         
         flash('Registration successful! Please login.', 'success')
@@ -510,7 +2215,33 @@ def logout():
     session.clear()
     return redirect(url_for('index'))
 
+def product_filters(category_id=None, product_type=None):
+    """Extra conditions and parameters for the storefront product list filters"""
+    conditions, params = [], []
+    if category_id:
+        conditions.append('p.category_id = ?')
+        params.append(category_id)
+    
+    if product_type == 'racing':
+        conditions.append('p.is_racing = 1')
+    elif product_type == 'daily':
+        conditions.append('p.is_daily = 1')
+    return conditions, params
+
+def product_search_query(conditions=()):
+    """SQL for one page of BM25-ranked search results; name matches weigh most, then brand"""
+    _, base_conditions, _, _ = KEYSET_PAGES['products']
+    return f'''
+        SELECT p.*, snippet(products_fts, 1, ?, ?, '...', 16) as search_snippet
+        FROM products_fts
+        JOIN products p ON p.id = products_fts.rowid
+        WHERE products_fts MATCH ? AND {' AND '.join(base_conditions + list(conditions))}
+        ORDER BY bm25(products_fts, 10.0, 1.0, 5.0), p.created_at DESC
+        LIMIT ? OFFSET ?
+    '''
+
 @app.route('/products')
+@conditional_page('products', 'categories')
 def products():
     category_id = request.args.get('category')
     product_type = request.args.get('type')  # racing or daily
@@ -518,38 +2249,54 @@ def products():
     
     conn = get_db_connection()
     
-    query = 'SELECT * FROM products WHERE stock_quantity > 0'
-    params = []
-    
-    if category_id:
-        query += ' AND category_id = ?'
-        params.append(category_id)
-    
-    if product_type == 'racing':
-        query += ' AND is_racing = 1'
-    elif product_type == 'daily':
-        query += ' AND is_daily = 1'
-    
-    if search:
-        query += ' AND (name LIKE ? OR description LIKE ? OR brand LIKE ?)'
-        search_term = f'%{search}%'
-        params.extend([search_term, search_term, search_term])
+    page_size = get_page_size('PAGE_SIZE')
+    conditions, params = product_filters(category_id, product_type)
+    
+    fts_query = build_fts_query(search) if search and FTS5_AVAILABLE else ''
+    if fts_query:
+        # Ranked results page by position since the rank isn't an indexed key
+        after = decode_cursor(request.args.get('after'))
+        offset = after[0] if after and len(after) == 1 and isinstance(after[0], int) else 0
+        products = conn.execute(
+            product_search_query(conditions),
+            [SNIPPET_START, SNIPPET_END, fts_query] + params + [page_size + 1, offset]
+        ).fetchall()
+        next_cursor = encode_cursor(offset + page_size) if len(products) > page_size else None
+        products = products[:page_size]
+    else:
+        if search:
+            conditions.append('(p.name LIKE ? OR p.description LIKE ? OR p.brand LIKE ?)')
+            search_term = f'%{search}%'
+            params.extend([search_term, search_term, search_term])
+        products, next_cursor = fetch_keyset_page(conn, 'products', page_size, conditions, params)
     
-    query += ' ORDER BY created_at DESC'
+    if wants_json():
+        conn.close()
+        return page_json(products, next_cursor)
     
-    products = conn.execute(query, params).fetchall()
     categories = conn.execute('SELECT * FROM categories').fetchall()
     
     conn.close()
     
+    snippets = {}
+    if fts_query and app.config['SEARCH_SNIPPETS']:
+        snippets = {
+            product['id']: render_snippet(product['search_snippet'])
+            for product in products if product['search_snippet']
+        }
+    
     return render_template('products.html', 
                          products=products, 
                          categories=categories,
+                         snippets=snippets,
+                         next_cursor=next_cursor,
                          selected_category=category_id,
                          selected_type=product_type,
                          search_term=search)
 
 @app.route('/services')
+@conditional_page('services')
+@cached_page('services', 'image_variants')
 def services():
     service_type = request.args.get('type')  # racing or daily
     
@@ -573,6 +2320,7 @@ def services():
                          selected_type=service_type)
 
 @app.route('/about')
+@cached_page('team_members', 'collaborate_teams', 'image_variants')
 def about():
     conn = get_db_connection()
     team_members = conn.execute('''
@@ -590,7 +2338,22 @@ def about():
     
     return render_template('about.html', team_members=team_members, collaborate_teams=collaborate_teams)
 
+RELATED_PRODUCTS_QUERY = '''
+    SELECT * FROM products 
+    WHERE category_id = ? AND id != ? AND stock_quantity > 0
+    LIMIT 4
+'''
+PRODUCT_REVIEWS_QUERY = '''
+    SELECT r.*, u.first_name, u.last_name 
+    FROM reviews r 
+    JOIN users u ON r.customer_id = u.id 
+    WHERE r.product_id = ?
+    ORDER BY r.created_at DESC
+'''
+
 @app.route('/product/<int:product_id>')
+@conditional_page('products', 'reviews')
+@cached_page('products', 'reviews', 'image_variants')
 def product_detail(product_id):
     conn = get_db_connection()
     product = conn.execute('SELECT * FROM products WHERE id = ?', (product_id,)).fetchone()
@@ -600,20 +2363,10 @@ def product_detail(product_id):
         return redirect(url_for('products'))
     
     # Get related products
-    related_products = conn.execute('''
-        SELECT * FROM products 
-        WHERE category_id = ? AND id != ? AND stock_quantity > 0
-        LIMIT 4
-    ''', (product['category_id'], product_id)).fetchall()
+    related_products = conn.execute(RELATED_PRODUCTS_QUERY, (product['category_id'], product_id)).fetchall()
     
     # Get reviews
-    reviews = conn.execute('''
-        SELECT r.*, u.first_name, u.last_name 
-        FROM reviews r 
-        JOIN users u ON r.customer_id = u.id 
-        WHERE r.product_id = ?
-        ORDER BY r.created_at DESC
-    ''', (product_id,)).fetchall()
+    reviews = conn.execute(PRODUCT_REVIEWS_QUERY, (product_id,)).fetchall()
     
     conn.close()
     
@@ -622,6 +2375,31 @@ def product_detail(product_id):
                          related_products=related_products,
                          reviews=reviews)
 
+def add_cart_items(conn, session_id, lines):
+    """Upsert (item_type, product_id, service_id, quantity) lines into a cart; the caller commits.
+
+    Raises sqlite3.IntegrityError when a line names a product or service that does not exist.
+    """
+    created_at = datetime.now().isoformat()
+    conn.executemany(f'''
+        INSERT INTO cart (session_id, product_id, service_id, quantity, item_type, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT ({CART_ITEM_KEY}) DO UPDATE SET quantity = quantity + excluded.quantity
+    ''', [(session_id, product_id, service_id, quantity, item_type, created_at)
+          for item_type, product_id, service_id, quantity in lines])
+
+def parse_cart_line(product_id, service_id, quantity):
+    """Validate one requested cart line; returns (item_type, product_id, service_id, quantity) or None"""
+    try:
+        product_id = int(product_id) if product_id else None
+        service_id = int(service_id) if service_id else None
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        return None
+    if quantity < 1 or (product_id is None) == (service_id is None):
+        return None
+    return ('product' if product_id else 'service', product_id, service_id, quantity)
+
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     if not is_logged_in():
@@ -631,36 +2409,67 @@ def add_to_cart():
     if is_admin():
         return jsonify({'success': False, 'message': 'Administrators cannot add items to cart. Please use a customer account.'})
     
-    product_id = request.form.get('product_id')
-    service_id = request.form.get('service_id')
-    quantity = int(request.form.get('quantity', 1))
-    item_type = 'product' if product_id else 'service'
+    line = parse_cart_line(request.form.get('product_id'), request.form.get('service_id'),
+                           request.form.get('quantity', 1))
+    if line is None:
+        return jsonify({'success': False, 'message': 'Invalid item or quantity'})
     
     conn = get_db_connection()
+    try:
+        add_cart_items(conn, session['user_id'], [line])
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return jsonify({'success': False, 'message': 'Item not found'})
+    conn.commit()
+    conn.close()
     
-    # Check if item exists in cart
-    existing_item = conn.execute('''
-        SELECT * FROM cart 
-        WHERE session_id = ? AND product_id = ? AND service_id = ? AND item_type = ?
-    ''', (session['user_id'], product_id, service_id, item_type)).fetchone()
+    return jsonify({'success': True, 'message': 'Item added to cart'})
+
+@app.route('/add_to_cart/batch', methods=['POST'])
+def add_to_cart_batch():
+    """Add several lines in one request and one commit.
+
+    Body: {"items": [{"product_id": 1, "quantity": 2}, {"service_id": 3}, ...]}
+    """
+    if not is_logged_in():
+        return jsonify({'success': False, 'message': 'Please login to add items to cart'})
     
-    if existing_item:
-        # Update quantity
-        conn.execute('''
-            UPDATE cart SET quantity = quantity + ? 
-            WHERE id = ?
-        ''', (quantity, existing_item['id']))
-    else:
-        # Add new item
-        conn.execute('''
-            INSERT INTO cart (session_id, product_id, service_id, quantity, item_type, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], product_id, service_id, quantity, item_type, datetime.now().isoformat()))
+    if is_admin():
+        return jsonify({'success': False, 'message': 'Administrators cannot add items to cart. Please use a customer account.'})
     
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'No items given'})
+    
+    lines = []
+    for index, item in enumerate(items):
+        line = parse_cart_line(item.get('product_id'), item.get('service_id'), item.get('quantity', 1)) \
+            if isinstance(item, dict) else None
+        if line is None:
+            return jsonify({'success': False, 'message': f'Invalid item or quantity at position {index}'})
+        lines.append(line)
+    
+    conn = get_db_connection()
+    try:
+        add_cart_items(conn, session['user_id'], lines)
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return jsonify({'success': False, 'message': 'One or more items were not found; nothing was added'})
     conn.commit()
     conn.close()
     
-    return jsonify({'success': True, 'message': 'Item added to cart'})
+    return jsonify({'success': True, 'message': f'{len(lines)} item(s) added to cart'})
+
+CART_ITEMS_QUERY = '''
+    SELECT c.*, p.name as product_name, p.price as product_price, p.image as product_image,
+           s.name as service_name, s.price as service_price
+    FROM cart c
+    LEFT JOIN products p ON c.product_id = p.id
+    LEFT JOIN services s ON c.service_id = s.id
+    WHERE c.session_id = ?
+    ORDER BY c.created_at DESC
+'''
 
 @app.route('/cart')
 def cart():
@@ -670,15 +2479,7 @@ def cart():
     
     conn = get_db_connection()
     
-    cart_items = conn.execute('''
-        SELECT c.*, p.name as product_name, p.price as product_price, p.image as product_image,
-               s.name as service_name, s.price as service_price
-        FROM cart c
-        LEFT JOIN products p ON c.product_id = p.id
-        LEFT JOIN services s ON c.service_id = s.id
-        WHERE c.session_id = ?
-        ORDER BY c.created_at DESC
-    ''', (session['user_id'],)).fetchall()
+    cart_items = conn.execute(CART_ITEMS_QUERY, (session['user_id'],)).fetchall()
     
     conn.close()
     
@@ -697,6 +2498,16 @@ def remove_from_cart(cart_id):
     flash('Item removed from cart', 'success')
     return redirect(url_for('cart'))
 
+CHECKOUT_CART_QUERY = '''
+    SELECT c.*, p.name as product_name, p.price as product_price,
+           s.name as service_name, s.price as service_price
+    FROM cart c
+    LEFT JOIN products p ON c.product_id = p.id
+    LEFT JOIN services s ON c.service_id = s.id
+    WHERE c.session_id = ?
+'''
+CLEAR_CART_QUERY = 'DELETE FROM cart WHERE session_id = ?'
+
 @app.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     if not is_logged_in():
@@ -710,14 +2521,7 @@ def checkout():
         conn = get_db_connection()
         
         # Get cart items
-        cart_items = conn.execute('''
-            SELECT c.*, p.name as product_name, p.price as product_price,
-                   s.name as service_name, s.price as service_price
-            FROM cart c
-            LEFT JOIN products p ON c.product_id = p.id
-            LEFT JOIN services s ON c.service_id = s.id
-            WHERE c.session_id = ?
-        ''', (session['user_id'],)).fetchall()
+        cart_items = conn.execute(CHECKOUT_CART_QUERY, (session['user_id'],)).fetchall()
         
         if not cart_items:
             flash('Your cart is empty', 'error')
@@ -729,58 +2533,67 @@ def checkout():
             for item in cart_items
         )
         
-        # Create order
-        order_number = generate_order_number()
-        conn.execute('''
-            INSERT INTO orders (customer_id, order_number, total_amount, delivery_address, phone, notes, order_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], order_number, total_amount, delivery_address, phone, notes, datetime.now().isoformat()))
-        
-        order_id = conn.lastrowid
-        
-        # Create order items
-        for item in cart_items:
-            conn.execute('''
+        # Write the order, its items, stock decrements and inventory ledger rows
+        # in a single transaction on this connection
+        customer_id = session['user_id']
+        product_items = [item for item in cart_items if item['product_id']]
+        order_date = datetime.now().isoformat()
+        try:
+            cursor = conn.cursor()
+            order_number = generate_order_number(cursor)
+            cursor.execute('''
+                INSERT INTO orders (customer_id, order_number, total_amount, delivery_address, phone, notes, order_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (customer_id, order_number, total_amount, delivery_address, phone, notes, order_date))
+            
+            order_id = cursor.lastrowid
+            
+            # Create order items
+            cursor.executemany('''
                 INSERT INTO order_items (order_id, product_id, service_id, quantity, price, item_type)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (order_id, item['product_id'], item['service_id'], item['quantity'], 
-                  item['product_price'] or item['service_price'] or 0, item['item_type']))
+            ''', [(order_id, item['product_id'], item['service_id'], item['quantity'],
+                   item['product_price'] or item['service_price'] or 0, item['item_type'])
+                  for item in cart_items])
             
-            # Update stock for products and record inventory transaction
-            if item['product_id']:
-                conn.execute('''
-                    UPDATE products SET stock_quantity = stock_quantity - ?
-                    WHERE id = ?
-                ''', (item['quantity'], item['product_id']))
-                
-                # Record inventory transaction
-                record_inventory_transaction(
-                    product_id=item['product_id'],
-                    transaction_type='sale',
-                    quantity=-item['quantity'],  # Negative for sales
-                    order_id=order_id,
-                    customer_id=session['user_id'],
-                    admin_id=None,  # Online order
-                    notes=f"Online order {order_number}",
-                    unit_price=item['product_price'] or 0,
-                    total_amount=(item['product_price'] or 0) * item['quantity']
-                )
-        
-        # Clear cart
-        conn.execute('DELETE FROM cart WHERE session_id = ?', (session['user_id'],))
+            # Update stock for products and record inventory transactions (negative for sales)
+            cursor.executemany('''
+                UPDATE products SET stock_quantity = stock_quantity - ?, updated_at = ?
+                WHERE id = ?
+            ''', [(item['quantity'], order_date, item['product_id']) for item in product_items])
+            
+            record_inventory_transactions(cursor, [
+                (item['product_id'], 'sale', -item['quantity'], order_id, customer_id, None,
+                 f"Online order {order_number}", item['product_price'] or 0,
+                 (item['product_price'] or 0) * item['quantity'])
+                for item in product_items
+            ])
+            rollup_sale(cursor, 'online', order_id)
+            
+            # Clear cart
+            cursor.execute(CLEAR_CART_QUERY, (customer_id,))
+            
+            conn.commit()
+            tables_changed('orders', 'products', 'inventory_transactions', 'sales_rollups')
+        except sqlite3.Error:
+            conn.rollback()
+            conn.close()
+            flash('We could not place your order. Please try again.', 'error')
+            return redirect(url_for('cart'))
         
-        conn.commit()
         conn.close()
         
         flash(f'Order placed successfully! Order number: {order_number}', 'success')
         return redirect(url_for('order_history'))
     
     # Get user info for checkout form
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    conn.close()
-    
-    return render_template('checkout.html', user=user)
+    return render_template('checkout.html', user=get_current_user())
+
+ORDER_HISTORY_QUERY = '''
+    SELECT * FROM orders 
+    WHERE customer_id = ? 
+    ORDER BY order_date DESC
+'''
 
 @app.route('/order_history')
 def order_history():
@@ -788,15 +2601,20 @@ def order_history():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    orders = conn.execute('''
-        SELECT * FROM orders 
-        WHERE customer_id = ? 
-        ORDER BY order_date DESC
-    ''', (session['user_id'],)).fetchall()
+    orders = conn.execute(ORDER_HISTORY_QUERY, (session['user_id'],)).fetchall()
     conn.close()
     
     return render_template('order_history.html', orders=orders)
 
+ORDER_ITEMS_QUERY = '''
+    SELECT oi.*, p.name as product_name, p.image as product_image,
+           s.name as service_name
+    FROM order_items oi
+    LEFT JOIN products p ON oi.product_id = p.id
+    LEFT JOIN services s ON oi.service_id = s.id
+    WHERE oi.order_id = ?
+'''
+
 @app.route('/order/<int:order_id>')
 def order_detail(order_id):
     if not is_logged_in():
@@ -814,14 +2632,7 @@ def order_detail(order_id):
         return redirect(url_for('order_history'))
     
     # Get order items
-    order_items = conn.execute('''
-        SELECT oi.*, p.name as product_name, p.image as product_image,
-               s.name as service_name
-        FROM order_items oi
-        LEFT JOIN products p ON oi.product_id = p.id
-        LEFT JOIN services s ON oi.service_id = s.id
-        WHERE oi.order_id = ?
-    ''', (order_id,)).fetchall()
+    order_items = conn.execute(ORDER_ITEMS_QUERY, (order_id,)).fetchall()
     
     conn.close()
     
@@ -833,39 +2644,22 @@ def admin_dashboard():
     if not is_logged_in() or not is_admin():
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    
-    # Get statistics
-    total_products = conn.execute('SELECT COUNT(*) as count FROM products').fetchone()['count']
-    total_orders = conn.execute('SELECT COUNT(*) as count FROM orders').fetchone()['count']
-    total_customers = conn.execute('SELECT COUNT(*) as count FROM users WHERE role = "customer"').fetchone()['count']
-    total_revenue = conn.execute('SELECT SUM(total_amount) as total FROM orders WHERE status = "completed"').fetchone()['total']
-    total_revenue = total_revenue if total_revenue is not None else 0
-    
-    # Get recent orders
-    recent_orders = conn.execute('''
-        SELECT o.*, u.first_name, u.last_name 
-        FROM orders o 
-        JOIN users u ON o.customer_id = u.id 
-        ORDER BY o.order_date DESC 
-        LIMIT 10
-    ''').fetchall()
-    
-    # Get low stock products
-    low_stock = conn.execute('''
-        SELECT * FROM products WHERE stock_quantity < 10
-        ORDER BY stock_quantity ASC
-    ''').fetchall()
-    
-    conn.close()
+    stats = get_dashboard_stats()
     
     return render_template('admin/dashboard.html',
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_customers=total_customers,
-                         total_revenue=total_revenue,
-                         recent_orders=recent_orders,
-                         low_stock=low_stock)
+                         total_products=stats['total_products'],
+                         total_orders=stats['total_orders'],
+                         total_customers=stats['total_customers'],
+                         total_revenue=stats['total_revenue'],
+                         recent_orders=stats['recent_orders'],
+                         low_stock=stats['low_stock'])
+
+@app.route('/admin/dashboard/stats')
+def admin_dashboard_stats():
+    if not is_logged_in() or not is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    return jsonify({'success': True, 'stats': get_dashboard_stats()})
 
 @app.route('/admin/products')
 def admin_products():
@@ -873,16 +2667,23 @@ def admin_products():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    products = conn.execute('''
-        SELECT p.*, c.name as category_name 
-        FROM products p 
-        LEFT JOIN categories c ON p.category_id = c.id 
-        ORDER BY p.created_at DESC
-    ''').fetchall()
+    products, next_cursor = fetch_keyset_page(conn, 'admin_products', get_page_size('ADMIN_PAGE_SIZE'))
+    if wants_json():
+        conn.close()
+        return page_json(products, next_cursor)
     categories = conn.execute('SELECT * FROM categories').fetchall()
     conn.close()
     
-    return render_template('admin/products.html', products=products, categories=categories)
+    return render_template('admin/products.html', products=products, categories=categories,
+                           next_cursor=next_cursor)
+
+def product_form_error(error):
+    """Flash message for an IntegrityError from the product forms, or None if it isn't one they expect"""
+    if 'idx_products_key' in str(error):
+        return 'A product with this brand, model and name already exists'
+    if 'FOREIGN KEY' in str(error):
+        return 'Category not found'
+    return None
 
 @app.route('/admin/products/add', methods=['GET', 'POST'])
 def admin_add_product():
@@ -906,21 +2707,32 @@ def admin_add_product():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO products (name, description, price, category_id, brand, model, year_range, 
-                                stock_quantity, image, is_racing, is_daily, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, description, price, category_id, brand, model, year_range, 
-              stock_quantity, image, is_racing, is_daily, 
-              datetime.now().isoformat(), datetime.now().isoformat()))
+        try:
+            cursor = conn.execute('''
+                INSERT INTO products (name, description, price, category_id, brand, model, year_range, 
+                                    stock_quantity, image, is_racing, is_daily, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, description, price, category_id, brand, model, year_range, 
+                  stock_quantity, image, is_racing, is_daily, 
+                  datetime.now().isoformat(), datetime.now().isoformat()))
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            message = product_form_error(e)
+            if not message:
+                raise
+            categories = conn.execute('SELECT * FROM categories').fetchall()
+            conn.close()
+            flash(message, 'error')
+            return render_template('admin/add_product.html', categories=categories)
+        if stock_quantity:
+            record_inventory_transaction(cursor.lastrowid, 'adjustment', stock_quantity,
+                                         admin_id=session['user_id'], notes='Opening stock', conn=conn)
         
         conn.commit()
+        tables_changed('products', 'inventory_transactions')
         conn.close()
         
         flash('Product added successfully', 'success')
@@ -932,21 +2744,224 @@ def admin_add_product():
     
     return render_template('admin/add_product.html', categories=categories)
 
+# Bulk product import
+# Supplier catalogs arrive as CSV, a JSON array or JSON Lines, one product per row. Rows are
+# validated as they are read and written in chunks: each chunk upserts on PRODUCT_KEY and
+# ledgers its restock quantities in one transaction, so a failed import never leaves stock
+# and ledger out of step, and chunks already committed stay imported.
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ERRORS = 1000  # per-row errors kept for the report
+IMPORT_FORMATS = ('csv', 'json', 'jsonl', 'ndjson')
+
+def read_import_rows(stream, filename):
+    """Yield (row number, row) from a binary stream; row is None when it is not an object"""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    text = TextIOWrapper(stream, encoding='utf-8-sig', newline='' if extension == 'csv' else None)
+    if extension == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif extension == 'json':
+        # A JSON array has to be parsed whole; use JSON Lines for very large catalogs
+        rows = json.load(text)
+        if not isinstance(rows, list):
+            raise ValueError('A JSON import must be an array of products')
+        for number, row in enumerate(rows, 1):
+            yield number, row if isinstance(row, dict) else None
+    else:
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield number, row if isinstance(row, dict) else None
+
+def import_flag(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'y'):
+        return 1
+    if value in ('0', 'false', 'no', 'n'):
+        return 0
+    raise ValueError(f"'{value}' is not a yes/no value")
+
+def parse_import_row(row, categories):
+    """Validate one catalog row into upsert parameters; raises ValueError with the reason"""
+    if row is None:
+        raise ValueError('Row is not an object')
+    row = {str(key).strip().lower(): value.strip() if isinstance(value, str) else value
+           for key, value in row.items() if key is not None}
+    name = row.get('name')
+    if not name:
+        raise ValueError('Missing name')
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError('Price must be a number')
+    if not 0 <= price < float('inf'):
+        raise ValueError('Price must be a non-negative number')
+    quantity = row.get('quantity', row.get('stock_quantity')) or 0
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ValueError('Quantity must be a whole number')
+    if quantity < 0:
+        raise ValueError('Quantity must not be negative')
+    
+    category_id = None
+    category = row.get('category') or row.get('category_id')
+    if category:
+        category_id = categories.get(str(category).lower())
+        if category_id is None:
+            raise ValueError(f"Unknown category '{category}'")
+    
+    # Optional columns left out of a row keep the product's current value
+    return {
+        'name': str(name), 'brand': str(row.get('brand') or ''), 'model': str(row.get('model') or ''),
+        'price': price, 'quantity': quantity, 'category_id': category_id,
+        'description': row.get('description') or None, 'year_range': row.get('year_range') or None,
+        'is_racing': import_flag(row.get('is_racing')), 'is_daily': import_flag(row.get('is_daily')),
+    }
+
+def write_import_chunk(conn, rows, admin_id, imported_at):
+    """Upsert one chunk of parsed rows and ledger their restocks in a single transaction"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany(f'''
+            INSERT INTO products (name, description, price, category_id, brand, model, year_range,
+                                  stock_quantity, is_racing, is_daily, created_at, updated_at)
+            VALUES (:name, COALESCE(:description, ''), :price, :category_id, :brand, :model, COALESCE(:year_range, ''),
+                    :quantity, COALESCE(:is_racing, 0), COALESCE(:is_daily, 1), :imported_at, :imported_at)
+            ON CONFLICT ({PRODUCT_KEY}) DO UPDATE SET
+                price = excluded.price,
+                stock_quantity = stock_quantity + excluded.stock_quantity,
+                description = COALESCE(:description, description),
+                category_id = COALESCE(:category_id, category_id),
+                year_range = COALESCE(:year_range, year_range),
+                is_racing = COALESCE(:is_racing, is_racing),
+                is_daily = COALESCE(:is_daily, is_daily),
+                updated_at = excluded.updated_at
+        ''', [dict(row, imported_at=imported_at) for row in rows])
+        
+        restocked = [row for row in rows if row['quantity']]
+        if restocked:
+            keys = {(row['brand'], row['model'], row['name']) for row in restocked}
+            product_ids = {tuple(found[1:]): found[0] for found in conn.execute(f'''
+                SELECT id, {PRODUCT_KEY} FROM products
+                WHERE ({PRODUCT_KEY}) IN (VALUES {', '.join(['(?, ?, ?)'] * len(keys))})
+            ''', [value for key in keys for value in key]).fetchall()}
+            record_inventory_transactions(conn, [
+                (product_ids[(row['brand'], row['model'], row['name'])], 'restock', row['quantity'],
+                 None, None, admin_id, 'Bulk import', 0, 0)
+                for row in restocked
+            ])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def import_products(conn, rows, admin_id=None, dry_run=False):
+    """Validate and upsert (row number, row) pairs; returns a report dict"""
+    started = time.perf_counter()
+    imported_at = datetime.now().isoformat()
+    categories = {}
+    for category in conn.execute('SELECT id, name FROM categories').fetchall():
+        categories[category['name'].lower()] = category['id']
+        categories[str(category['id'])] = category['id']
+    
+    report = {'rows': 0, 'imported': 0, 'created': 0, 'restocked_units': 0, 'error_count': 0, 'errors': [],
+              'read_error': None}
+    chunk = []
+    
+    def flush():
+        if chunk and not dry_run:
+            write_import_chunk(conn, chunk, admin_id, imported_at)
+        report['imported'] += len(chunk)
+        report['restocked_units'] += sum(row['quantity'] for row in chunk)
+        chunk.clear()
+    
+    try:
+        try:
+            for number, row in rows:
+                report['rows'] += 1
+                try:
+                    chunk.append(parse_import_row(row, categories))
+                except ValueError as e:
+                    report['error_count'] += 1
+                    if len(report['errors']) < IMPORT_MAX_ERRORS:
+                        report['errors'].append({'row': number, 'error': str(e)})
+                    continue
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    flush()
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            # The file stopped being readable part way; the rows read before that point are
+            # kept (committed chunks cannot be taken back), and the report says where it stopped
+            report['read_error'] = f"Stopped reading after {report['rows']} rows: {e}"
+        flush()
+    finally:
+        # Chunks commit as they go, so announce whatever landed even if a later one failed
+        if not dry_run and report['imported']:
+            report['created'] = conn.execute('SELECT COUNT(*) FROM products WHERE created_at = ?',
+                                             (imported_at,)).fetchone()[0]
+            tables_changed('products', 'inventory_transactions')
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed) if elapsed else report['rows']
+    report['dry_run'] = dry_run
+    return report
+
+@app.route('/admin/products/import', methods=['POST'])
+def admin_import_products():
+    """Bulk import a supplier catalog; JSON report with ?format=json, otherwise flash a summary"""
+    if not is_logged_in() or not is_admin():
+        if wants_json():
+            return jsonify({'success': False, 'message': 'Unauthorized'})
+        return redirect(url_for('login'))
+    
+    file = request.files.get('file')
+    if not file or not file.filename or file.filename.rsplit('.', 1)[-1].lower() not in IMPORT_FORMATS:
+        message = 'Upload a .csv, .json or .jsonl file'
+        if wants_json():
+            return jsonify({'success': False, 'message': message})
+        flash(message, 'error')
+        return redirect(url_for('admin_products'))
+    
+    conn = get_db_connection()
+    report = import_products(conn, read_import_rows(file.stream, file.filename),
+                             admin_id=session['user_id'], dry_run=request.values.get('dry_run') == '1')
+    conn.close()
+    
+    if wants_json():
+        return jsonify(dict(report, success=report['read_error'] is None))
+    summary = (f"Imported {report['imported']} of {report['rows']} rows ({report['created']} new products, "
+               f"{report['restocked_units']} units restocked) at {report['rows_per_second']} rows/s")
+    if report['rows'] or not report['read_error']:
+        flash(summary, 'success')
+    if report['read_error']:
+        flash(f"Could not read all of {file.filename}. {report['read_error']}", 'error')
+    for error in report['errors'][:10]:
+        flash(f"Row {error['row']}: {error['error']}", 'error')
+    if report['error_count'] > 10:
+        flash(f"{report['error_count'] - 10} more rows were rejected; use ?format=json for the full list", 'error')
+    return redirect(url_for('admin_products'))
+
 @app.route('/admin/orders')
 def admin_orders():
     if not is_logged_in() or not is_admin():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    orders = conn.execute('''
-        SELECT o.*, u.first_name, u.last_name, u.email 
-        FROM orders o 
-        JOIN users u ON o.customer_id = u.id 
-        ORDER BY o.order_date DESC
-    ''').fetchall()
+    orders, next_cursor = fetch_keyset_page(conn, 'admin_orders', get_page_size('ADMIN_PAGE_SIZE'))
     conn.close()
     
-    return render_template('admin/orders.html', orders=orders)
+    if wants_json():
+        return page_json(orders, next_cursor)
+    
+    return render_template('admin/orders.html', orders=orders, next_cursor=next_cursor)
 
 @app.route('/admin/orders/<int:order_id>/update_status', methods=['POST'])
 def admin_update_order_status(order_id):
@@ -956,25 +2971,146 @@ def admin_update_order_status(order_id):
     new_status = request.form['status']
     
     conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    order = conn.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()
     conn.execute('UPDATE orders SET status = ? WHERE id = ?', (new_status, order_id))
+    # Cancelling an order takes it out of the sales rollups; reinstating it puts it back
+    if order and (order['status'] in ROLLUP_EXCLUDED_STATUSES) != (new_status in ROLLUP_EXCLUDED_STATUSES):
+        rollup_sale(conn, 'online', order_id, -1 if new_status in ROLLUP_EXCLUDED_STATUSES else 1)
     conn.commit()
+    tables_changed('orders', 'sales_rollups')
     conn.close()
     
     flash('Order status updated successfully', 'success')
     return redirect(url_for('admin_orders'))
 
+ANALYTICS_DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}  # periods shown when no start is given
+ANALYTICS_DIMENSIONS = {'product': 'products', 'service': 'services', 'category': 'categories', 'payment_method': None}
+
+def default_analytics_start(period, end):
+    count = ANALYTICS_DEFAULT_PERIODS[period] - 1
+    if period == 'month':
+        months = end.year * 12 + end.month - 1 - count
+        return end.replace(year=months // 12, month=months % 12 + 1, day=1)
+    return rollup_period_start(period, end - timedelta(days=count * (7 if period == 'week' else 1)))
+
+ANALYTICS_SERIES_QUERY = '''
+    SELECT period_start, SUM(units) as units, ROUND(SUM(revenue), 2) as revenue, SUM(documents) as documents,
+           ROUND(SUM(CASE WHEN channel = 'online' THEN revenue ELSE 0 END), 2) as online_revenue,
+           ROUND(SUM(CASE WHEN channel = 'walkin' THEN revenue ELSE 0 END), 2) as walkin_revenue
+    FROM sales_rollups
+    WHERE period = ? AND dimension = 'total' AND period_start BETWEEN ? AND ? {channel_filter}
+    GROUP BY period_start
+    ORDER BY period_start
+'''
+ANALYTICS_TOP_QUERY = '''
+    SELECT dimension_key as key, SUM(units) as units, ROUND(SUM(revenue), 2) as revenue, SUM(documents) as documents
+    FROM sales_rollups
+    WHERE period = ? AND dimension = '{dimension}' AND period_start BETWEEN ? AND ? {channel_filter}
+    GROUP BY dimension_key
+    ORDER BY SUM(revenue) DESC
+    LIMIT ?
+'''
+
+def sales_analytics(conn, period, start, end, channel=None, limit=10):
+    """Revenue series and top products, services, categories and payment methods, read from sales_rollups"""
+    channel_filter = 'AND channel = ?' if channel else ''
+    params = [period, rollup_period_start(period, start).isoformat(), end.isoformat()] + ([channel] if channel else [])
+    series = [dict(row) for row in conn.execute(
+        ANALYTICS_SERIES_QUERY.format(channel_filter=channel_filter), params).fetchall()]
+    
+    analytics = {
+        'period': period, 'start': start.isoformat(), 'end': end.isoformat(), 'channel': channel,
+        'series': series,
+        'totals': {
+            'units': sum(row['units'] for row in series),
+            'revenue': round(sum(row['revenue'] for row in series), 2),
+            'documents': sum(row['documents'] for row in series),
+        },
+    }
+    for dimension, table in ANALYTICS_DIMENSIONS.items():
+        rows = [dict(row) for row in conn.execute(
+            ANALYTICS_TOP_QUERY.format(dimension=dimension, channel_filter=channel_filter), params + [limit]).fetchall()]
+        # Only the handful of top rows need a name
+        names = {}
+        ids = [row['key'] for row in rows if row['key']]
+        if table and ids:
+            names = {str(row['id']): row['name'] for row in conn.execute(
+                f"SELECT id, name FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()}
+        for row in rows:
+            row['name'] = names.get(row['key']) if table else row['key']
+            if not row['name']:
+                row['name'] = 'Uncategorized' if dimension == 'category' and not row['key'] else 'Unknown'
+        analytics[dimension] = rows
+    return analytics
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    """Sales analytics page; ?format=json returns the same data"""
+    if not is_logged_in() or not is_admin():
+        if wants_json():
+            return jsonify({'success': False, 'message': 'Unauthorized'})
+        return redirect(url_for('login'))
+    
+    period = request.args.get('period', 'month')
+    channel = request.args.get('channel') or None
+    try:
+        if period not in ROLLUP_PERIODS or channel not in (None, 'online', 'walkin'):
+            raise ValueError('Unknown period or channel')
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        start = (datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start')
+                 else default_analytics_start(period, end))
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+    except ValueError as e:
+        if wants_json():
+            return jsonify({'success': False, 'message': str(e)})
+        flash('Invalid analytics filters', 'error')
+        return redirect(url_for('admin_analytics'))
+    
+    conn = get_db_connection()
+    analytics = sales_analytics(conn, period, start, end, channel, limit)
+    conn.close()
+    
+    if wants_json():
+        return jsonify(dict(analytics, success=True))
+    return render_template('admin/analytics.html', analytics=analytics, periods=ROLLUP_PERIODS)
+
 @app.route('/admin/customers')
 def admin_customers():
     if not is_logged_in() or not is_admin():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    customers = conn.execute('''
-        SELECT * FROM users WHERE role = 'customer' ORDER BY created_at DESC
-    ''').fetchall()
+    customers, next_cursor = fetch_keyset_page(conn, 'admin_customers', get_page_size('ADMIN_PAGE_SIZE'))
     conn.close()
     
-    return render_template('admin/customers.html', customers=customers)
+    if wants_json():
+        return page_json(customers, next_cursor)
+    
+    return render_template('admin/customers.html', customers=customers, next_cursor=next_cursor)
+
+INVENTORY_SUMMARY_QUERY = '''
+    SELECT p.id, p.name, p.brand, p.model, p.stock_quantity, p.price,
+           c.name as category_name,
+           COALESCE(s.total_sold, 0) as total_sold,
+           COALESCE(s.total_walkin, 0) as total_walkin,
+           COALESCE(s.total_restock, 0) as total_restock,
+           COALESCE(s.total_returned, 0) as total_returned
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+    LEFT JOIN product_inventory_stats s ON s.product_id = p.id
+    ORDER BY p.name
+'''
+RECENT_INVENTORY_TRANSACTIONS_QUERY = '''
+    SELECT it.*, p.name as product_name, p.brand, p.model,
+           u.first_name, u.last_name, o.order_number
+    FROM inventory_transactions it
+    JOIN products p ON it.product_id = p.id
+    LEFT JOIN users u ON it.admin_id = u.id
+    LEFT JOIN orders o ON it.order_id = o.id
+    ORDER BY it.transaction_date DESC
+    LIMIT 50
+'''
 
 @app.route('/admin/inventory')
 def admin_inventory():
@@ -983,40 +3119,11 @@ def admin_inventory():
     
     conn = get_db_connection()
     
-    # Get inventory summary
-    inventory_summary = conn.execute('''
-        SELECT p.id, p.name, p.brand, p.model, p.stock_quantity, p.price,
-               c.name as category_name,
-               COALESCE(sold.total_sold, 0) as total_sold,
-               COALESCE(walkin.total_walkin, 0) as total_walkin
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN (
-            SELECT product_id, SUM(ABS(quantity)) as total_sold
-            FROM inventory_transactions 
-            WHERE transaction_type = 'sale'
-            GROUP BY product_id
-        ) sold ON p.id = sold.product_id
-        LEFT JOIN (
-            SELECT product_id, SUM(ABS(quantity)) as total_walkin
-            FROM inventory_transactions 
-            WHERE transaction_type = 'walkin'
-            GROUP BY product_id
-        ) walkin ON p.id = walkin.product_id
-        ORDER BY p.name
-    ''').fetchall()
+    # Get inventory summary from the maintained per-product counters
+    inventory_summary = conn.execute(INVENTORY_SUMMARY_QUERY).fetchall()
     
     # Get recent inventory transactions
-    recent_transactions = conn.execute('''
-        SELECT it.*, p.name as product_name, p.brand, p.model,
-               u.first_name, u.last_name, o.order_number
-        FROM inventory_transactions it
-        JOIN products p ON it.product_id = p.id
-        LEFT JOIN users u ON it.admin_id = u.id
-        LEFT JOIN orders o ON it.order_id = o.id
-        ORDER BY it.transaction_date DESC
-        LIMIT 50
-    ''').fetchall()
+    recent_transactions = conn.execute(RECENT_INVENTORY_TRANSACTIONS_QUERY).fetchall()
     
     conn.close()
     
@@ -1030,15 +3137,15 @@ def admin_walkin_sales():
         return redirect(url_for('login'))
     
     conn = get_db_connection()
-    walkin_sales = conn.execute('''
-        SELECT ws.*, u.first_name, u.last_name
-        FROM walkin_sales ws
-        LEFT JOIN users u ON ws.admin_id = u.id
-        ORDER BY ws.sale_date DESC
-    ''').fetchall()
+    walkin_sales, next_cursor = fetch_keyset_page(conn, 'admin_walkin_sales', get_page_size('ADMIN_PAGE_SIZE'))
     conn.close()
     
-    return render_template('admin/walkin_sales.html', walkin_sales=walkin_sales)
+    if wants_json():
+        return page_json(walkin_sales, next_cursor)
+    
+    return render_template('admin/walkin_sales.html', walkin_sales=walkin_sales, next_cursor=next_cursor)
+
+WALKIN_PRODUCTS_QUERY = 'SELECT * FROM products WHERE stock_quantity > 0 ORDER BY name'
 
 @app.route('/admin/walkin-sales/new', methods=['GET', 'POST'])
 def admin_new_walkin_sale():
@@ -1059,80 +3166,40 @@ def admin_new_walkin_sale():
             flash('Please add at least one product', 'error')
             return redirect(url_for('admin_new_walkin_sale'))
         
-        conn = get_db_connection()
-        
-        # Calculate total amount
-        total_amount = 0
-        sale_items = []
-        
-        for i, product_id in enumerate(product_ids):
-            if quantities[i] and int(quantities[i]) > 0:
-                product = conn.execute('SELECT * FROM products WHERE id = ?', (product_id,)).fetchone()
-                if product and product['stock_quantity'] >= int(quantities[i]):
-                    quantity = int(quantities[i])
-                    unit_price = product['price'] or 0
-                    item_total = unit_price * quantity
-                    total_amount += item_total
-                    
-                    sale_items.append({
-                        'product_id': product_id,
-                        'quantity': quantity,
-                        'unit_price': unit_price,
-                        'total_price': item_total,
-                        'product_name': product['name']
-                    })
+        # Merge repeated lines for the same product
+        sale_quantities = {}
+        for product_id, quantity in zip(product_ids, quantities):
+            try:
+                product_id, quantity = int(product_id), int(quantity)
+            except ValueError:
+                continue
+            if quantity > 0:
+                sale_quantities[product_id] = sale_quantities.get(product_id, 0) + quantity
         
-        if not sale_items:
+        if not sale_quantities:
             flash('No valid products selected', 'error')
-            conn.close()
             return redirect(url_for('admin_new_walkin_sale'))
         
-        # Create walk-in sale
-        sale_number = generate_sale_number()
-        conn.execute('''
-            INSERT INTO walkin_sales (sale_number, customer_name, customer_phone, total_amount, payment_method, admin_id, sale_date, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (sale_number, customer_name, customer_phone, total_amount, payment_method, session['user_id'], datetime.now().isoformat(), notes))
-        
-        sale_id = conn.lastrowid
+        conn = get_db_connection()
+        sale_number, sale_items, skipped = create_walkin_sale(
+            conn, sale_quantities, customer_name, customer_phone, payment_method,
+            session['user_id'], notes
+        )
+        conn.close()
         
-        # Create sale items and update inventory
-        for item in sale_items:
-            conn.execute('''
-                INSERT INTO walkin_sale_items (walkin_sale_id, product_id, quantity, unit_price, total_price)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (sale_id, item['product_id'], item['quantity'], item['unit_price'], item['total_price']))
-            
-            # Update stock
-            conn.execute('''
-                UPDATE products SET stock_quantity = stock_quantity - ?
-                WHERE id = ?
-            ''', (item['quantity'], item['product_id']))
-            
-            # Record inventory transaction
-            record_inventory_transaction(
-                product_id=item['product_id'],
-                transaction_type='walkin',
-                quantity=-item['quantity'],
-                order_id=None,
-                customer_id=None,
-                admin_id=session['user_id'],
-                notes=f"Walk-in sale {sale_number}",
-                unit_price=item['unit_price'],
-                total_amount=item['total_price']
-            )
+        if not sale_number:
+            flash('No valid products selected', 'error')
+            return redirect(url_for('admin_new_walkin_sale'))
         
-        conn.commit()
-        conn.close()
+        if skipped:
+            flash(f'{len(skipped)} item(s) were skipped because they are out of stock', 'error')
         
         flash(f'Walk-in sale completed! Sale number: {sale_number}', 'success')
         return redirect(url_for('admin_walkin_sales'))
     
     # Get all products for selection
     conn = get_db_connection()
-    products = conn.execute('''
-        SELECT * FROM products WHERE stock_quantity > 0 ORDER BY name
-    ''').fetchall()
+    products = conn.execute(WALKIN_PRODUCTS_QUERY).fetchall()
     conn.close()
     
     return render_template('admin/new_walkin_sale.html', products=products)
@@ -1152,11 +3219,16 @@ def admin_restock_inventory():
     
     conn = get_db_connection()
     
-    # Update stock
-    conn.execute('''
-        UPDATE products SET stock_quantity = stock_quantity + ?
+    # Update stock; an unknown product has no row to ledger against
+    cursor = conn.execute('''
+        UPDATE products SET stock_quantity = stock_quantity + ?, updated_at = ?
         WHERE id = ?
-    ''', (quantity, product_id))
+    ''', (quantity, datetime.now().isoformat(), product_id))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        flash('Product not found', 'error')
+        return redirect(url_for('admin_inventory'))
     
     # Record inventory transaction
     record_inventory_transaction(
@@ -1164,10 +3236,12 @@ def admin_restock_inventory():
         transaction_type='restock',
         quantity=quantity,
         admin_id=session['user_id'],
-        notes=notes or f"Restocked {quantity} units"
+        notes=notes or f"Restocked {quantity} units",
+        conn=conn
     )
     
     conn.commit()
+    tables_changed('products', 'inventory_transactions')
     conn.close()
     
     flash('Inventory restocked successfully', 'success')
@@ -1178,11 +3252,7 @@ def profile():
     if not is_logged_in():
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    conn.close()
-    
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=get_current_user())
 
 @app.route('/update_cart_quantity', methods=['POST'])
 def update_cart_quantity():
@@ -1226,30 +3296,48 @@ def admin_edit_product(product_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
-        # Update product
-        if image:
-            conn.execute('''
-                UPDATE products SET name = ?, description = ?, price = ?, category_id = ?, 
-                                  brand = ?, model = ?, year_range = ?, stock_quantity = ?, 
-                                  image = ?, is_racing = ?, is_daily = ?, updated_at = ?
-                WHERE id = ?
-            ''', (name, description, price, category_id, brand, model, year_range, 
-                  stock_quantity, image, is_racing, is_daily, datetime.now().isoformat(), product_id))
-        else:
-            conn.execute('''
-                UPDATE products SET name = ?, description = ?, price = ?, category_id = ?, 
-                                  brand = ?, model = ?, year_range = ?, stock_quantity = ?, 
-                                  is_racing = ?, is_daily = ?, updated_at = ?
-                WHERE id = ?
-            ''', (name, description, price, category_id, brand, model, year_range, 
-                  stock_quantity, is_racing, is_daily, datetime.now().isoformat(), product_id))
+        # Update product; a changed stock count is ledgered as an adjustment in the same transaction
+        conn.execute('BEGIN IMMEDIATE')
+        current = conn.execute('SELECT stock_quantity FROM products WHERE id = ?', (product_id,)).fetchone()
+        if current and current['stock_quantity'] != stock_quantity:
+            record_inventory_transaction(product_id, 'adjustment', stock_quantity - current['stock_quantity'],
+                                         admin_id=session['user_id'], notes='Stock edited', conn=conn)
+        try:
+            if image:
+                conn.execute('''
+                    UPDATE products SET name = ?, description = ?, price = ?, category_id = ?, 
+                                      brand = ?, model = ?, year_range = ?, stock_quantity = ?, 
+                                      image = ?, is_racing = ?, is_daily = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (name, description, price, category_id, brand, model, year_range, 
+                      stock_quantity, image, is_racing, is_daily, datetime.now().isoformat(), product_id))
+            else:
+                conn.execute('''
+                    UPDATE products SET name = ?, description = ?, price = ?, category_id = ?, 
+                                      brand = ?, model = ?, year_range = ?, stock_quantity = ?, 
+                                      is_racing = ?, is_daily = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (name, description, price, category_id, brand, model, year_range, 
+                      stock_quantity, is_racing, is_daily, datetime.now().isoformat(), product_id))
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            message = product_form_error(e)
+            if not message:
+                raise
+            # Re-render with what the admin entered rather than the stored row
+            product = dict(conn.execute('SELECT * FROM products WHERE id = ?', (product_id,)).fetchone(),
+                           name=name, description=description, price=price, category_id=category_id,
+                           brand=brand, model=model, year_range=year_range, stock_quantity=stock_quantity,
+                           is_racing=is_racing, is_daily=is_daily)
+            categories = conn.execute('SELECT * FROM categories').fetchall()
+            conn.close()
+            flash(message, 'error')
+            return render_template('admin/edit_product.html', product=product, categories=categories)
         
         conn.commit()
+        tables_changed('products', 'inventory_transactions')
         conn.close()
         
         flash('Product updated successfully', 'success')
@@ -1266,6 +3354,9 @@ def admin_edit_product(product_id):
     
     return render_template('admin/edit_product.html', product=product, categories=categories)
 
+PRODUCT_ORDER_CHECK_QUERY = 'SELECT COUNT(*) as count FROM order_items WHERE product_id = ?'
+PRODUCT_LEDGER_CHECK_QUERY = 'SELECT 1 FROM inventory_transactions WHERE product_id = ? LIMIT 1'
+
 @app.route('/admin/products/<int:product_id>/delete', methods=['POST'])
 def admin_delete_product(product_id):
     if not is_logged_in() or not is_admin():
@@ -1281,25 +3372,33 @@ def admin_delete_product(product_id):
         return redirect(url_for('admin_products'))
     
     # Check if product is in any orders
-    order_items = conn.execute('''
-        SELECT COUNT(*) as count FROM order_items WHERE product_id = ?
-    ''', (product_id,)).fetchone()
+    order_items = conn.execute(PRODUCT_ORDER_CHECK_QUERY, (product_id,)).fetchone()
     
     if order_items['count'] > 0:
         flash('Cannot delete product that has been ordered. Consider marking as discontinued instead.', 'error')
         conn.close()
         return redirect(url_for('admin_products'))
     
-    # Delete product image if exists
-    if product['image']:
-        try:
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], product['image']))
-        except:
-            pass  # Ignore if file doesn't exist
+    # The inventory ledger is append-only, so a product with any ledger rows (opening stock
+    # included) stays; its stock can be adjusted to zero instead
+    if conn.execute(PRODUCT_LEDGER_CHECK_QUERY, (product_id,)).fetchone():
+        flash('Cannot delete product that has inventory or sales history. Set its stock to 0 instead.', 'error')
+        conn.close()
+        return redirect(url_for('admin_products'))
     
-    # Delete product
-    conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
-    conn.commit()
+    # Delete product (foreign keys are enforced, so drop it from carts first)
+    try:
+        conn.execute('DELETE FROM cart WHERE product_id = ?', (product_id,))
+        conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
+        conn.commit()
+        tables_changed('products')
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        flash('Cannot delete product that still has reviews, inventory or sales history.', 'error')
+        conn.close()
+        return redirect(url_for('admin_products'))
+    
+    # The product image may be shared with other rows; gc-uploads reclaims it once unreferenced
     conn.close()
     
     flash('Product deleted successfully', 'success')
@@ -1327,10 +3426,11 @@ def admin_add_category():
         
         conn = get_db_connection()
         conn.execute('''
-            INSERT INTO categories (name, description, created_at)
-            VALUES (?, ?, ?)
-        ''', (name, description, datetime.now().isoformat()))
+            INSERT INTO categories (name, description, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', (name, description, datetime.now().isoformat(), datetime.now().isoformat()))
         conn.commit()
+        tables_changed('categories')
         conn.close()
         
         flash('Category added successfully', 'success')
@@ -1354,6 +3454,7 @@ def admin_edit_category(category_id):
             WHERE id = ?
         ''', (name, description, datetime.now().isoformat(), category_id))
         conn.commit()
+        tables_changed('categories')
         conn.close()
         
         flash('Category updated successfully', 'success')
@@ -1368,6 +3469,8 @@ def admin_edit_category(category_id):
     
     return render_template('admin/edit_category.html', category=category)
 
+CATEGORY_PRODUCT_CHECK_QUERY = 'SELECT COUNT(*) as count FROM products WHERE category_id = ?'
+
 @app.route('/admin/categories/<int:category_id>/delete', methods=['POST'])
 def admin_delete_category(category_id):
     if not is_logged_in() or not is_admin():
@@ -1376,14 +3479,22 @@ def admin_delete_category(category_id):
     conn = get_db_connection()
     
     # Check if category has products
-    products = conn.execute('SELECT COUNT(*) as count FROM products WHERE category_id = ?', (category_id,)).fetchone()
+    products = conn.execute(CATEGORY_PRODUCT_CHECK_QUERY, (category_id,)).fetchone()
     if products['count'] > 0:
         flash('Cannot delete category that has products. Please move or delete products first.', 'error')
         conn.close()
         return redirect(url_for('admin_categories'))
     
-    conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
-    conn.commit()
+    # A product added since the check still holds the category under the enforced foreign key
+    try:
+        conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        conn.close()
+        flash('Cannot delete category that has products. Please move or delete products first.', 'error')
+        return redirect(url_for('admin_categories'))
+    tables_changed('categories')
     conn.close()
     
     flash('Category deleted successfully', 'success')
@@ -1417,10 +3528,7 @@ def admin_add_service():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1428,6 +3536,7 @@ def admin_add_service():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (name, description, price, is_racing, is_daily, image, datetime.now().isoformat(), datetime.now().isoformat()))
         conn.commit()
+        tables_changed('services')
         conn.close()
         
         flash('Service added successfully', 'success')
@@ -1454,10 +3563,7 @@ def admin_edit_service(service_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         # Update service
         if image:
@@ -1472,6 +3578,7 @@ def admin_edit_service(service_id):
             ''', (name, description, price, is_racing, is_daily, datetime.now().isoformat(), service_id))
         
         conn.commit()
+        tables_changed('services')
         conn.close()
         
         flash('Service updated successfully', 'success')
@@ -1521,10 +3628,7 @@ def admin_add_team_member():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1532,6 +3636,7 @@ def admin_add_team_member():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (name, role, description, image, linkedin_url, twitter_url, instagram_url, display_order, is_active, datetime.now().isoformat(), datetime.now().isoformat()))
         conn.commit()
+        tables_changed('team_members')
         conn.close()
         
         flash('Team member added successfully', 'success')
@@ -1561,10 +3666,7 @@ def admin_edit_team_member(member_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         # Update team member
         if image:
@@ -1579,6 +3681,7 @@ def admin_edit_team_member(member_id):
             ''', (name, role, description, linkedin_url, twitter_url, instagram_url, display_order, is_active, datetime.now().isoformat(), member_id))
         
         conn.commit()
+        tables_changed('team_members')
         conn.close()
         
         flash('Team member updated successfully', 'success')
@@ -1601,6 +3704,7 @@ def admin_delete_team_member(member_id):
     conn = get_db_connection()
     conn.execute('DELETE FROM team_members WHERE id = ?', (member_id,))
     conn.commit()
+    tables_changed('team_members')
     conn.close()
     
     flash('Team member deleted successfully', 'success')
@@ -1616,9 +3720,7 @@ def admin_update_team_member_image(member_id):
     
     file = request.files['image']
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1626,6 +3728,7 @@ def admin_update_team_member_image(member_id):
             WHERE id = ?
         ''', (filename, datetime.now().isoformat(), member_id))
         conn.commit()
+        tables_changed('team_members')
         conn.close()
         
         return jsonify({
@@ -1671,10 +3774,7 @@ def admin_add_collaborate_team():
         if 'logo' in request.files:
             file = request.files['logo']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                logo = filename
+                logo = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1682,6 +3782,7 @@ def admin_add_collaborate_team():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (team_name, logo, description, website_url, contact_email, contact_phone, partnership_type, display_order, is_active, datetime.now().isoformat(), datetime.now().isoformat()))
         conn.commit()
+        tables_changed('collaborate_teams')
         conn.close()
         
         flash('Collaborate team added successfully', 'success')
@@ -1711,10 +3812,7 @@ def admin_edit_collaborate_team(team_id):
         if 'logo' in request.files:
             file = request.files['logo']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                logo = filename
+                logo = save_upload(file)
         
         if logo:
             conn.execute('''
@@ -1728,6 +3826,7 @@ def admin_edit_collaborate_team(team_id):
             ''', (team_name, description, website_url, contact_email, contact_phone, partnership_type, display_order, is_active, datetime.now().isoformat(), team_id))
         
         conn.commit()
+        tables_changed('collaborate_teams')
         conn.close()
         
         flash('Collaborate team updated successfully', 'success')
@@ -1750,6 +3849,7 @@ def admin_delete_collaborate_team(team_id):
     conn = get_db_connection()
     conn.execute('DELETE FROM collaborate_teams WHERE id = ?', (team_id,))
     conn.commit()
+    tables_changed('collaborate_teams')
     conn.close()
     
     flash('Collaborate team deleted successfully', 'success')
@@ -1765,9 +3865,7 @@ def admin_update_collaborate_team_logo(team_id):
     
     file = request.files['logo']
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1775,6 +3873,7 @@ def admin_update_collaborate_team_logo(team_id):
             WHERE id = ?
         ''', (filename, datetime.now().isoformat(), team_id))
         conn.commit()
+        tables_changed('collaborate_teams')
         conn.close()
         
         return jsonify({
@@ -1819,10 +3918,7 @@ def admin_add_award():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1830,6 +3926,7 @@ def admin_add_award():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (title, subtitle, image, year, category, description, display_order, is_active, datetime.now().isoformat(), datetime.now().isoformat()))
         conn.commit()
+        tables_changed('awards')
         conn.close()
         
         flash('Award added successfully', 'success')
@@ -1858,10 +3955,7 @@ def admin_edit_award(award_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image = filename
+                image = save_upload(file)
         
         if image:
             conn.execute('''
@@ -1875,6 +3969,7 @@ def admin_edit_award(award_id):
             ''', (title, subtitle, year, category, description, display_order, is_active, datetime.now().isoformat(), award_id))
         
         conn.commit()
+        tables_changed('awards')
         conn.close()
         
         flash('Award updated successfully', 'success')
@@ -1897,6 +3992,7 @@ def admin_delete_award(award_id):
     conn = get_db_connection()
     conn.execute('DELETE FROM awards WHERE id = ?', (award_id,))
     conn.commit()
+    tables_changed('awards')
     conn.close()
     
     flash('Award deleted successfully', 'success')
@@ -1912,9 +4008,7 @@ def admin_update_award_image(award_id):
     
     file = request.files['image']
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1922,6 +4016,7 @@ def admin_update_award_image(award_id):
             WHERE id = ?
         ''', (filename, datetime.now().isoformat(), award_id))
         conn.commit()
+        tables_changed('awards')
         conn.close()
         
         return jsonify({
@@ -1932,6 +4027,8 @@ def admin_update_award_image(award_id):
     else:
         return jsonify({'success': False, 'message': 'Invalid file format'})
 
+SERVICE_ORDER_CHECK_QUERY = 'SELECT COUNT(*) as count FROM order_items WHERE service_id = ?'
+
 @app.route('/admin/services/<int:service_id>/delete', methods=['POST'])
 def admin_delete_service(service_id):
     if not is_logged_in() or not is_admin():
@@ -1940,17 +4037,24 @@ def admin_delete_service(service_id):
     conn = get_db_connection()
     
     # Check if service is in any orders
-    order_items = conn.execute('''
-        SELECT COUNT(*) as count FROM order_items WHERE service_id = ?
-    ''', (service_id,)).fetchone()
+    order_items = conn.execute(SERVICE_ORDER_CHECK_QUERY, (service_id,)).fetchone()
     
     if order_items['count'] > 0:
         flash('Cannot delete service that has been ordered.', 'error')
         conn.close()
         return redirect(url_for('admin_services'))
     
-    conn.execute('DELETE FROM services WHERE id = ?', (service_id,))
-    conn.commit()
+    # Foreign keys are enforced, so drop it from carts first; reviews keep it in place
+    try:
+        conn.execute('DELETE FROM cart WHERE service_id = ?', (service_id,))
+        conn.execute('DELETE FROM services WHERE id = ?', (service_id,))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        conn.close()
+        flash('Cannot delete service that has reviews or orders.', 'error')
+        return redirect(url_for('admin_services'))
+    tables_changed('services')
     conn.close()
     
     flash('Service deleted successfully', 'success')
@@ -1967,9 +4071,7 @@ def admin_update_service_image(service_id):
     
     file = request.files['image']
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = save_upload(file)
         
         conn = get_db_connection()
         conn.execute('''
@@ -1977,6 +4079,7 @@ def admin_update_service_image(service_id):
             WHERE id = ?
         ''', (filename, datetime.now().isoformat(), service_id))
         conn.commit()
+        tables_changed('services')
         conn.close()
         
         return jsonify({
@@ -1987,6 +4090,506 @@ def admin_update_service_image(service_id):
     else:
         return jsonify({'success': False, 'message': 'Invalid file format'})
 
+# Database pool statistics
+@app.route('/admin/db-pool')
+def admin_db_pool_stats():
+    if not is_logged_in() or not is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    return jsonify({'success': True, 'pool': db_pool.stats()})
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Instrumentation aggregates in the Prometheus text exposition format"""
+    if not is_logged_in() or not is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    lines = request_latency.render('tech13_request_duration_seconds', 'Request latency by endpoint.')
+    lines += query_latency.render('tech13_db_query_duration_seconds', 'SQL statement latency by endpoint.')
+    lines += ['# HELP tech13_db_slow_queries_total Statements slower than SLOW_QUERY_MS.',
+              '# TYPE tech13_db_slow_queries_total counter']
+    with slow_query_lock:
+        lines += [f'tech13_db_slow_queries_total{{endpoint="{prometheus_escape(endpoint)}"}} {count}'
+                  for endpoint, count in sorted(slow_query_counts.items())]
+    
+    for prefix, stats in (('tech13_db_pool', db_pool.stats()), ('tech13_page_cache', page_cache.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                lines.append(f'{prefix}_{key} {value}')
+    
+    if not app.config['INSTRUMENTATION']:
+        lines.insert(0, '# Instrumentation is off; set TECH13_INSTRUMENTATION=1 to collect latencies')
+    return app.response_class('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/page-cache')
+def admin_page_cache_stats():
+    if not is_logged_in() or not is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    return jsonify({'success': True, 'cache': page_cache.stats()})
+
+@app.route('/admin/inventory/stock')
+def admin_inventory_stock():
+    """Stock per product from the ledger, optionally as of ?as_of=YYYY-MM-DD[THH:MM:SS]"""
+    if not is_logged_in() or not is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    as_of = request.args.get('as_of')
+    if as_of:
+        try:
+            parsed = datetime.fromisoformat(as_of)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid as_of date'})
+        # A bare date means the end of that day
+        as_of = parsed.isoformat() if 'T' in as_of or ' ' in as_of else f"{parsed.date().isoformat()}T23:59:59.999999"
+    
+    conn = get_db_connection()
+    stock = ledger_stock(conn, as_of)
+    conn.close()
+    return jsonify({'success': True, 'as_of': as_of, 'stock': {str(product_id): quantity for product_id, quantity in stock.items()}})
+
+# CSV exports
+# Each dataset is one SELECT read in chunks with fetchmany and written to the response as it
+# goes, so memory stays flat however much history is exported. The export holds its own
+# pooled connection: a streamed body outlives the request's connection.
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_QUERIES = {
+    'orders': ('''
+        SELECT o.id, o.order_number, o.order_date, o.status, o.total_amount, o.customer_id,
+               u.username, u.email, o.phone, o.delivery_address, o.notes
+        FROM orders o
+        LEFT JOIN users u ON u.id = o.customer_id
+    ''', 'o.order_date', 'o.id'),
+    'order_items': ('''
+        SELECT oi.id, oi.order_id, o.order_number, o.order_date, oi.item_type, oi.product_id, oi.service_id,
+               COALESCE(p.name, s.name) as item_name, oi.quantity, oi.price, oi.quantity * oi.price as line_total
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        LEFT JOIN products p ON p.id = oi.product_id
+        LEFT JOIN services s ON s.id = oi.service_id
+    ''', 'o.order_date', 'oi.id'),
+    'walkin_sales': ('''
+        SELECT ws.id, ws.sale_number, ws.sale_date, ws.customer_name, ws.customer_phone, ws.payment_method,
+               ws.total_amount, ws.admin_id, u.username as admin_username, ws.notes
+        FROM walkin_sales ws
+        LEFT JOIN users u ON u.id = ws.admin_id
+    ''', 'ws.sale_date', 'ws.id'),
+    'walkin_sale_items': ('''
+        SELECT wsi.id, wsi.walkin_sale_id, ws.sale_number, ws.sale_date, wsi.product_id, p.name as product_name,
+               wsi.quantity, wsi.unit_price, wsi.total_price
+        FROM walkin_sales ws
+        JOIN walkin_sale_items wsi ON wsi.walkin_sale_id = ws.id
+        LEFT JOIN products p ON p.id = wsi.product_id
+    ''', 'ws.sale_date', 'wsi.id'),
+    'inventory_transactions': ('''
+        SELECT t.id, t.transaction_date, t.transaction_type, t.product_id, p.name as product_name, t.quantity,
+               t.unit_price, t.total_amount, t.order_id, t.customer_id, t.admin_id, t.notes
+        FROM inventory_transactions t
+        LEFT JOIN products p ON p.id = t.product_id
+    ''', 't.transaction_date', 't.id'),
+}
+
+def export_query(dataset, start=None, end=None):
+    """SQL and parameters for an export, oldest first, limited to start..end inclusive"""
+    query, date_column, id_column = EXPORT_QUERIES[dataset]
+    conditions, params = [], []
+    if start:
+        conditions.append(f'{date_column} >= ?')
+        params.append(start)
+    if end:
+        conditions.append(f'{date_column} <= ?')
+        params.append(f'{end}T23:59:59.999999')
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return f'{query} ORDER BY {date_column}, {id_column}', params
+
+def stream_csv(query, params):
+    """Yield CSV text chunk by chunk from a query, header row first"""
+    conn = db_pool.acquire()
+    try:
+        cursor = conn.execute(query, params)
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db_pool.release(conn)
+
+@app.route('/admin/export/<dataset>.csv')
+def admin_export(dataset):
+    """Download a dataset as CSV, optionally limited with ?start=YYYY-MM-DD&end=YYYY-MM-DD"""
+    if not is_logged_in() or not is_admin():
+        return redirect(url_for('login'))
+    if dataset not in EXPORT_QUERIES:
+        flash('Unknown export', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    start, end = request.args.get('start') or None, request.args.get('end') or None
+    try:
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        flash('Export dates must be YYYY-MM-DD', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    query, params = export_query(dataset, start, end)
+    filename = '_'.join([dataset] + [value for value in (start, end) if value]) + '.csv'
+    return app.response_class(stream_csv(query, params), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+    })
+
+# Query plan checks
+# Built from the same constants and helpers the routes execute, so a route query change is checked.
+HOT_QUERIES = [
+    ('index featured products', FEATURED_PRODUCTS_QUERY),
+    ('products page', keyset_query('products', after=True)),
+    ('products by category', keyset_query('products', product_filters(category_id='1')[0], after=True)),
+    ('product search', product_search_query()),
+    ('related products', RELATED_PRODUCTS_QUERY),
+    ('product reviews', PRODUCT_REVIEWS_QUERY),
+    ('cart items', CART_ITEMS_QUERY),
+    ('checkout cart', CHECKOUT_CART_QUERY),
+    ('clear cart', CLEAR_CART_QUERY),
+    ('order history', ORDER_HISTORY_QUERY),
+    ('order items', ORDER_ITEMS_QUERY),
+    ('dashboard totals', DASHBOARD_TOTALS_QUERY),
+    ('dashboard recent orders', DASHBOARD_RECENT_ORDERS_QUERY),
+    ('dashboard low stock', DASHBOARD_LOW_STOCK_QUERY),
+    ('admin products', keyset_query('admin_products', after=True)),
+    ('admin orders', keyset_query('admin_orders', after=True)),
+    ('admin customers', keyset_query('admin_customers', after=True)),
+    ('inventory summary', INVENTORY_SUMMARY_QUERY),
+    ('recent inventory transactions', RECENT_INVENTORY_TRANSACTIONS_QUERY),
+    ('admin walk-in sales', keyset_query('admin_walkin_sales', after=True)),
+    ('walk-in products', WALKIN_PRODUCTS_QUERY),
+    ('product order check', PRODUCT_ORDER_CHECK_QUERY),
+    ('product ledger check', PRODUCT_LEDGER_CHECK_QUERY),
+    ('service order check', SERVICE_ORDER_CHECK_QUERY),
+    ('category product check', CATEGORY_PRODUCT_CHECK_QUERY),
+    ('analytics revenue series', ANALYTICS_SERIES_QUERY.format(channel_filter='AND channel = ?')),
+] + [
+    (f'analytics top {dimension}', ANALYTICS_TOP_QUERY.format(dimension=dimension, channel_filter=''))
+    for dimension in ANALYTICS_DIMENSIONS
+] + [(f'{dataset} export', export_query(dataset, 'start', 'end')[0]) for dataset in EXPORT_QUERIES]
+
+# Hot queries that scan by design: the exact plan steps allowed, and why. Any other scan fails the check.
+EXPECTED_SCANS = {
+    'index featured products': (['SCAN products USING INDEX idx_products_created'], 'newest first, stopped by LIMIT 8'),
+    'dashboard totals': (['SCAN products USING COVERING INDEX idx_products_stock',
+                          'SCAN orders USING COVERING INDEX idx_orders_date'],
+                         'COUNT(*) of products and orders; the dashboard caches it until a write'),
+    'dashboard recent orders': (['SCAN o USING INDEX idx_orders_date'], 'newest first, stopped by LIMIT 10'),
+    'inventory summary': (['SCAN p USING INDEX idx_products_name'], 'the page lists every product'),
+    'recent inventory transactions': (['SCAN it USING INDEX idx_inventory_transactions_date'],
+                                      'newest first, stopped by LIMIT 50'),
+    'walk-in products': (['SCAN products USING INDEX idx_products_name'], 'the sale form lists every product in stock'),
+}
+
+def find_table_scans(conn, query):
+    """Return the EXPLAIN QUERY PLAN steps of query that walk a whole table or index instead of a SEARCH range"""
+    params = [None] * query.count('?')
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+    # Index and covering-index scans count too. FTS5 reports a MATCH lookup as
+    # "SCAN <table> VIRTUAL TABLE INDEX 0:M<n>", and a SELECT without FROM as "SCAN CONSTANT ROW".
+    return [row['detail'] for row in plan
+            if row['detail'].startswith('SCAN ') and row['detail'] != 'SCAN CONSTANT ROW'
+            and 'VIRTUAL TABLE INDEX 0:M' not in row['detail']]
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations; a database with no users also gets the sample data."""
+    init_db()
+    conn = get_db_connection()
+    version = get_schema_version(conn)
+    if version < SCHEMA_VERSION:
+        print(f"Database is at schema version {version}, expected {SCHEMA_VERSION}")
+        raise SystemExit(1)
+    if seed_sample_data(conn):
+        print("Inserted sample data (admin login: admin / admin123)")
+    conn.close()
+
+@app.cli.command('seed-db')
+def seed_db_command():
+    """Insert the sample admin, categories, products and services into an empty database."""
+    if seed_sample_data(get_db_connection()):
+        print("Inserted sample data (admin login: admin / admin123)")
+    else:
+        print("Database already has users; sample data not inserted")
+
+@app.cli.command('bench-startup')
+@click.option('--runs', default=5, show_default=True, help='Cold imports of app.py to time.')
+@click.option('--max-ms', default=1500.0, show_default=True, help='Fail if the median import takes longer.')
+def bench_startup_command(runs, max_ms):
+    """Time cold process starts against an up-to-date database."""
+    init_db()
+    started = time.perf_counter()
+    init_db()
+    init_ms = (time.perf_counter() - started) * 1000
+    
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import app'], cwd=app.root_path, check=True,
+                       env=dict(os.environ, TECH13_DATABASE=app.config['DATABASE']))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    print(f"init_db() on a current schema: {init_ms:.1f} ms")
+    print(f"process start + import app: min {timings[0]:.0f} ms, median {median:.0f} ms, max {timings[-1]:.0f} ms")
+    if median > max_ms:
+        print(f"FAIL median start {median:.0f} ms exceeds {max_ms:.0f} ms")
+        raise SystemExit(1)
+
+@app.cli.command('migrate-uploads')
+def migrate_uploads_command():
+    """Move legacy timestamped uploads into content-addressed blobs, merging duplicates."""
+    conn = get_db_connection()
+    moved = 0
+    for table, column in UPLOAD_OWNERS.items():
+        rows = conn.execute(
+            f"SELECT id, {column} as image FROM {table} WHERE {column} IS NOT NULL AND {column} NOT LIKE 'blobs/%'"
+        ).fetchall()
+        for row in rows:
+            source = os.path.join(app.config['UPLOAD_FOLDER'], row['image'])
+            if not os.path.exists(source):
+                continue
+            with open(source, 'rb') as stream:
+                path, is_new = store_blob(conn, stream, row['image'].rsplit('.', 1)[-1].lower())
+            if is_new:
+                record_image_variants(conn, path)
+            conn.execute(f'UPDATE {table} SET {column} = ? WHERE id = ?', (path, row['id']))
+            conn.commit()
+            moved += 1
+    conn.close()
+    tables_changed('image_variants', *UPLOAD_OWNERS)
+    print(f"Moved {moved} upload reference(s) into blobs; run gc-uploads to delete the old files")
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Only list what would be deleted.')
+def gc_uploads_command(dry_run):
+    """Delete blobs and legacy uploads that no row references."""
+    conn = get_db_connection()
+    referenced = {row['image'] for row in conn.execute('SELECT DISTINCT image FROM upload_refs').fetchall()}
+    grace_seconds = app.config['UPLOAD_GC_GRACE_SECONDS']
+    reclaimed = 0
+    
+    for blob in find_unreferenced_blobs(conn, grace_seconds):
+        if dry_run:
+            print(f"would delete {blob['path']}")
+            reclaimed += blob['size'] or 0
+            continue
+        # Re-check under the write lock: an upload of the same bytes or a new reference since the
+        # scan keeps the blob. The file goes before the commit, so store_blob never reuses a row
+        # whose file is about to disappear.
+        conn.execute('BEGIN IMMEDIATE')
+        cutoff = datetime.fromtimestamp(time.time() - grace_seconds).isoformat()
+        if not conn.execute(f'DELETE FROM upload_blobs AS b WHERE b.hash = ? AND {UNREFERENCED_BLOBS}',
+                            (blob['hash'], cutoff)).rowcount:
+            conn.rollback()
+            continue
+        print(f"deleting {blob['path']}")
+        reclaimed += blob['size'] or 0
+        remove_image_variants(conn, blob['path'])
+        try:
+            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], blob['path']))
+        except OSError:
+            pass
+        conn.commit()
+    
+    # Legacy timestamped files left behind by migrate-uploads
+    cutoff = time.time() - grace_seconds
+    for filename in os.listdir(app.config['UPLOAD_FOLDER']):
+        full_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if (not os.path.isfile(full_path) or filename in referenced or not allowed_file(filename)
+                or os.path.getmtime(full_path) > cutoff):
+            continue
+        print(f"{'would delete' if dry_run else 'deleting'} {filename}")
+        reclaimed += os.path.getsize(full_path)
+        if not dry_run:
+            remove_image_variants(conn, filename)
+            conn.commit()
+            os.remove(full_path)
+    
+    conn.close()
+    tables_changed('image_variants')
+    print(f"{'Would reclaim' if dry_run else 'Reclaimed'} {reclaimed / 1024 / 1024:.1f} MB")
+
+@app.cli.command('generate-image-variants')
+def generate_image_variants_command():
+    """Generate resized variants for uploads that don't have them yet."""
+    conn = get_db_connection()
+    # Variants named before the extension was part of the name may be shared by two images; rebuild those
+    existing = {row['image'] for row in conn.execute('''
+        SELECT DISTINCT image FROM image_variants WHERE image NOT IN (
+            SELECT image FROM image_variants WHERE path IN (
+                SELECT path FROM image_variants GROUP BY path HAVING COUNT(DISTINCT image) > 1))
+    ''').fetchall()}
+    generated = 0
+    for filename in sorted(os.listdir(app.config['UPLOAD_FOLDER'])):
+        if filename in existing or not allowed_file(filename):
+            continue
+        if record_image_variants(conn, filename):
+            conn.commit()
+            generated += 1
+    conn.close()
+    tables_changed('image_variants')
+    print(f"Generated variants for {generated} image(s)")
+
+@app.cli.command('rebuild-inventory-stats')
+def rebuild_inventory_stats_command():
+    """Recompute product_inventory_stats from the inventory ledger."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    drifted = rebuild_inventory_stats(conn)
+    conn.commit()
+    conn.close()
+    if drifted:
+        print(f"Reconciled {len(drifted)} product(s): {', '.join(map(str, drifted))}")
+    else:
+        print("Inventory stats already match the ledger")
+
+@app.cli.command('snapshot-inventory')
+def snapshot_inventory_command():
+    """Snapshot the stock of every product with ledger rows since its last snapshot."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    taken = take_inventory_snapshots(conn)
+    conn.commit()
+    conn.close()
+    print(f"Took {taken} inventory snapshot(s)")
+
+@app.cli.command('reconcile-stock')
+@click.option('--fix', is_flag=True, help='Set products.stock_quantity to the ledger stock.')
+def reconcile_stock_command(fix):
+    """Compare products.stock_quantity with the stock derived from the inventory ledger."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    expected = ledger_stock(conn)
+    drifted = [(row['id'], row['stock_quantity'], expected[row['id']])
+               for row in conn.execute('SELECT id, stock_quantity FROM products').fetchall()
+               if row['stock_quantity'] != expected[row['id']]]
+    for product_id, stock_quantity, ledger_quantity in drifted:
+        print(f"product {product_id}: stock_quantity {stock_quantity}, ledger {ledger_quantity}")
+    if fix and drifted:
+        conn.executemany('UPDATE products SET stock_quantity = ?, updated_at = ? WHERE id = ?',
+                         [(ledger_quantity, datetime.now().isoformat(), product_id)
+                          for product_id, stock_quantity, ledger_quantity in drifted])
+    conn.commit()
+    conn.close()
+    if fix and drifted:
+        tables_changed('products')
+        print(f"Reset {len(drifted)} product(s) to the ledger stock")
+    elif drifted:
+        print(f"{len(drifted)} product(s) differ from the ledger; run with --fix to reset them")
+        raise SystemExit(1)
+    else:
+        print("Product stock matches the ledger")
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate every row without writing anything.')
+def import_products_command(path, dry_run):
+    """Bulk import products from a CSV, JSON or JSON Lines supplier catalog."""
+    if path.rsplit('.', 1)[-1].lower() not in IMPORT_FORMATS:
+        raise click.BadParameter('expected a .csv, .json, .jsonl or .ndjson file', param_hint='PATH')
+    conn = get_db_connection()
+    with open(path, 'rb') as stream:
+        report = import_products(conn, read_import_rows(stream, path), dry_run=dry_run)
+    conn.close()
+    for error in report['errors']:
+        print(f"row {error['row']}: {error['error']}")
+    if report['read_error']:
+        print(f"Could not read all of {path}. {report['read_error']}")
+    print(f"{'Validated' if dry_run else 'Imported'} {report['imported']} of {report['rows']} rows "
+          f"({report['created']} new, {report['restocked_units']} units restocked, {report['error_count']} rejected) "
+          f"in {report['seconds']:.2f}s, {report['rows_per_second']} rows/s")
+    if report['error_count'] or report['read_error']:
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-sales-rollups')
+def rebuild_sales_rollups_command():
+    """Recompute sales_rollups from orders and walk-in sales."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    changed = rebuild_sales_rollups(conn)
+    conn.commit()
+    conn.close()
+    tables_changed('sales_rollups')
+    if changed:
+        print(f"Reconciled {changed} rollup row(s)")
+    else:
+        print("Sales rollups already match orders and walk-in sales")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot route query scans a table or index it should search."""
+    conn = get_db_connection()
+    failures = 0
+    for name, query in HOT_QUERIES:
+        scans = find_table_scans(conn, query)
+        expected, reason = EXPECTED_SCANS.get(name, ([], None))
+        unexpected = [scan for scan in scans if scan not in expected]
+        if unexpected:
+            failures += 1
+            print(f"FAIL {name}: {'; '.join(unexpected)}")
+        elif scans:
+            print(f"scan {name}: {reason}")
+        else:
+            print(f"ok   {name}")
+    conn.close()
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('set-user-role')
+@click.argument('username')
+@click.argument('role', type=click.Choice(['customer', 'admin']))
+@click.option('--keep-sessions', is_flag=True,
+              help='With the memory session backend, change the role without revoking sessions.')
+def set_user_role_command(username, role, keep_sessions):
+    """Change a user's role and sign them out everywhere."""
+    # The memory store lives inside the server process; this CLI process only has its own empty one
+    in_memory = isinstance(session_store, MemorySessionStore)
+    if in_memory and not keep_sessions:
+        raise click.ClickException(
+            "Sessions are kept in server memory (TECH13_SESSION_BACKEND=memory) and cannot be revoked "
+            "from the command line. Re-run with --keep-sessions and restart the server to sign the user out.")
+    conn = get_db_connection()
+    user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if not user:
+        raise click.ClickException(f"No user named {username}")
+    conn.execute('UPDATE users SET role = ? WHERE id = ?', (role, user['id']))
+    conn.commit()
+    tables_changed('users')
+    conn.close()
+    if in_memory:
+        print(f"{username} is now {role}; existing sessions were NOT revoked, restart the server to sign them out")
+        return
+    # Sessions cache the role, so drop them rather than let the old one linger
+    session_store.revoke_user(user['id'])
+    print(f"{username} is now {role}; existing sessions were revoked")
+
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Delete expired server-side sessions."""
+    if isinstance(session_store, MemorySessionStore):
+        raise click.ClickException("The memory session backend expires sessions inside the server process; nothing to purge here")
+    print(f"Purged {session_store.purge_expired()} expired session(s)")
+
 if __name__ == '__main__':
+    # The development server keeps the old first-run behaviour of a ready-made demo login
+    with app.app_context():
+        if seed_sample_data(get_db_connection()):
+            print("Inserted sample data (admin login: admin / admin123)")
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
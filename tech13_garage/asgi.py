@@ -0,0 +1,130 @@
+"""ASGI entry point for TECH13 Garage.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The Flask routes stay synchronous. Each request body is received on the event loop and
+spooled to memory or disk, then the view runs on a bounded thread pool along with its
+SQLite work, so a slow upload only holds a connection and not a worker thread. Image
+variants are built in the background after the original is stored.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, db_pool
+
+ASGI_THREADS = int(os.environ.get('TECH13_ASGI_THREADS', 32))
+SPOOL_MAX_MEMORY = 1024 * 1024  # larger request bodies are spooled to a temp file
+
+app.config['BACKGROUND_IMAGE_VARIANTS'] = True
+# Every thread may hold a connection at once; keep that many idle instead of reopening them
+db_pool.max_idle = max(db_pool.max_idle, ASGI_THREADS)
+
+
+class WSGIBridge:
+    """Run a WSGI app under an ASGI server, one executor thread per in-flight request"""
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+                db_pool.close_all()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                more_body = message.get('more_body', False)
+            content_length = body.tell()
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            environ = self.build_environ(scope, body, content_length)
+            status, headers, iterable, iterator, chunk = await loop.run_in_executor(self.executor, self.start, environ)
+            try:
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+                })
+                while chunk is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    await loop.run_in_executor(self.executor, iterable.close)
+        finally:
+            body.close()
+
+    def start(self, environ):
+        """Call the app and read the first chunk, by which point start_response has run"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+
+        iterable = self.wsgi_app(environ, start_response)
+        iterator = iter(iterable)
+        chunk = next(iterator, None)
+        return response['status'], response['headers'], iterable, iterator, chunk
+
+    def build_environ(self, scope, body, content_length):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_LENGTH': str(content_length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+            if key in environ:
+                value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+            environ[key] = value
+        return environ
+
+
+application = WSGIBridge(app, ASGI_THREADS)
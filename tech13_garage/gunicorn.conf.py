@@ -0,0 +1,39 @@
+"""Gunicorn settings for TECH13 Garage, used by serve.py.
+
+Each value can be overridden from the environment; see the TECH13_* names below.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('TECH13_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# SQLite serialises writers, so a few processes with a handful of threads each beat many
+# single-threaded workers: threads overlap on network and disk I/O, not on write locks.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('TECH13_THREADS', 4))
+worker_class = 'gthread'
+
+# Import app.py (templates, asset manifest, connection pool setup) once in the master and
+# fork workers from it. The pool drops inherited connections after a fork.
+preload_app = True
+
+# Recycle workers periodically so slow leaks cannot accumulate; jitter avoids every
+# worker restarting at the same moment
+max_requests = int(os.environ.get('TECH13_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('TECH13_MAX_REQUESTS_JITTER', 100))
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+pidfile = os.environ.get('TECH13_PIDFILE', 'gunicorn.pid')
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Compile every template in the master so forked workers share the compiled code
+    from app import app
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    server.log.info("Precompiled %d templates", len(app.jinja_env.list_templates()))
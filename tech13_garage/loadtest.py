@@ -0,0 +1,276 @@
+"""Load test and micro-benchmarks for the storefront and walk-in sale flows.
+
+    python loadtest.py --products 50000 --customers 5000 --orders 200000 --iterations 100 --threads 4
+
+Seeds a synthetic catalog, customer base and order history into a scratch database (never
+tech13_garage.db), then drives browse -> search -> product -> add_to_cart -> cart ->
+checkout and the admin walk-in sale flow through Flask's test client from several
+threads. Prints throughput and p50/p95/p99 latency per step; exits non-zero if any step
+failed or if a p95 exceeds --max-p95-ms.
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+PART_WORDS = ['Brake', 'Clutch', 'Exhaust', 'Piston', 'Chain', 'Sprocket', 'Radiator', 'Filter',
+              'Fork', 'Shock', 'Lever', 'Mirror', 'Fairing', 'Sensor', 'Injector', 'Gasket']
+ADJECTIVES = ['Racing', 'Street', 'Titanium', 'Carbon', 'Forged', 'Sport', 'Touring', 'Heavy Duty']
+BRANDS = ['Brembo', 'EBC', 'Akrapovic', 'Yoshimura', 'Ohlins', 'Koni', 'Marchesini', 'OZ Racing', 'K&N', 'DID']
+STATUSES = ['pending', 'processing', 'completed', 'completed', 'completed', 'cancelled']
+PAYMENT_METHODS = ['cash', 'card', 'transfer']
+CHUNK_SIZE = 10000
+CUSTOMER_PASSWORD = 'loadtest'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', help='Scratch database path (default: a new temp directory)')
+    parser.add_argument('--reuse', action='store_true', help='Skip seeding when --db already has data')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--customers', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=50, help='Flow iterations per thread')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--walkin-ratio', type=float, default=0.25, help='Share of iterations that run the walk-in flow')
+    parser.add_argument('--micro-runs', type=int, default=50, help='Runs per micro-benchmark (0 to skip)')
+    parser.add_argument('--max-p95-ms', type=float, help='Fail if any step p95 is above this')
+    parser.add_argument('--seed', type=int, default=13)
+    return parser.parse_args()
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed_database(tech13, db_path, args, rng):
+    """Bulk-insert synthetic rows straight into SQLite, chunked into large transactions"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous = OFF')
+    tech13.seed_sample_data(conn)
+    now = datetime.now()
+
+    category_ids = [row['id'] for row in conn.execute('SELECT id FROM categories')]
+    products = []
+    for i in range(args.products):
+        part = rng.choice(PART_WORDS)
+        racing = rng.random() < 0.5
+        created = (now - timedelta(minutes=rng.randrange(525600))).isoformat()
+        products.append((f"{rng.choice(ADJECTIVES)} {part} {i}", f"{part} for {'track' if racing else 'street'} use",
+                         round(rng.uniform(5, 2000), 2), rng.choice(category_ids), rng.choice(BRANDS),
+                         rng.choice(['Racing', 'Street']), '2018-2024', rng.randint(50, 500),
+                         int(racing), int(not racing), created, created))
+    for chunk in chunks(products):
+        conn.executemany('''
+            INSERT INTO products (name, description, price, category_id, brand, model, year_range,
+                                  stock_quantity, is_racing, is_daily, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', chunk)
+        conn.commit()
+    tech13.record_opening_balances(conn)
+    tech13.rebuild_inventory_stats(conn)
+    tech13.take_inventory_snapshots(conn)
+    conn.commit()
+
+    # One hash shared by every synthetic customer; PBKDF2 per row would dominate seeding
+    password = tech13.generate_password_hash(CUSTOMER_PASSWORD)
+    customers = [(f'load{i}', f'load{i}@example.com', password, 'Load', f'Customer{i}', '555-0100',
+                  f'{i} Test Street', 'customer', (now - timedelta(days=rng.randrange(730))).isoformat())
+                 for i in range(args.customers)]
+    for chunk in chunks(customers):
+        conn.executemany('''
+            INSERT OR IGNORE INTO users (username, email, password, first_name, last_name, phone, address, role, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', chunk)
+        conn.commit()
+
+    product_rows = [(row['id'], row['price']) for row in conn.execute('SELECT id, price FROM products')]
+    customer_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE role = 'customer'")]
+    next_order_id = (conn.execute('SELECT COALESCE(MAX(id), 0) FROM orders').fetchone()[0] or 0) + 1
+    for start in range(0, args.orders, CHUNK_SIZE):
+        orders, items = [], []
+        for order_id in range(next_order_id + start, next_order_id + min(start + CHUNK_SIZE, args.orders)):
+            lines = [(rng.choice(product_rows), rng.randint(1, 3)) for _ in range(rng.randint(1, 3))]
+            total = sum(price * quantity for (_, price), quantity in lines)
+            orders.append((order_id, rng.choice(customer_ids), f'SEED-{order_id:08d}', round(total, 2),
+                           rng.choice(STATUSES), (now - timedelta(minutes=rng.randrange(525600))).isoformat(),
+                           'Synthetic address', '555-0100', ''))
+            items.extend((order_id, product_id, quantity, price, 'product') for (product_id, price), quantity in lines)
+        conn.executemany('''
+            INSERT INTO orders (id, customer_id, order_number, total_amount, status, order_date, delivery_address, phone, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', orders)
+        conn.executemany('''
+            INSERT INTO order_items (order_id, product_id, quantity, price, item_type) VALUES (?, ?, ?, ?, ?)
+        ''', items)
+        conn.commit()
+    tech13.rebuild_sales_rollups(conn)
+    conn.commit()
+    conn.close()
+
+
+class Recorder:
+    """Latency samples and failures per flow step, shared by the worker threads"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def timed(self, step, request, ok=lambda response: response.status_code < 400):
+        started = time.perf_counter()
+        response = request()
+        elapsed = time.perf_counter() - started
+        succeeded = ok(response)
+        with self.lock:
+            self.samples[step].append(elapsed)
+            if not succeeded:
+                self.failures[step] += 1
+        return response
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def login(client, username, password):
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise SystemExit(f"Could not log in as {username}")
+
+
+def customer_flow(client, recorder, rng, product_ids):
+    recorder.timed('GET /', lambda: client.get('/'))
+    recorder.timed('GET /products', lambda: client.get('/products'))
+    word = rng.choice(PART_WORDS + BRANDS).split()[0].lower()
+    recorder.timed('GET /products?search', lambda: client.get(f'/products?search={word}'))
+    product_id = rng.choice(product_ids)
+    recorder.timed('GET /product/<id>', lambda: client.get(f'/product/{product_id}'))
+    recorder.timed('POST /add_to_cart', lambda: client.post('/add_to_cart', data={'product_id': product_id, 'quantity': 1}),
+                   ok=lambda response: response.status_code == 200 and response.get_json().get('success'))
+    recorder.timed('GET /cart', lambda: client.get('/cart'))
+    # Success redirects to the order history; a failed checkout goes back to the cart
+    recorder.timed('POST /checkout', lambda: client.post('/checkout', data={'delivery_address': '1 Load St', 'phone': '555-0100'}),
+                   ok=lambda response: response.status_code == 302 and 'order' in response.headers.get('Location', ''))
+
+
+def walkin_flow(client, recorder, rng, product_ids):
+    recorder.timed('GET /admin/walkin-sales/new', lambda: client.get('/admin/walkin-sales/new'))
+    lines = rng.sample(product_ids, rng.randint(1, 3))
+    form = {'customer_name': 'Walk-in Load', 'customer_phone': '555-0199',
+            'payment_method': rng.choice(PAYMENT_METHODS), 'product_id': lines,
+            'quantity': [str(rng.randint(1, 2)) for _ in lines]}
+    recorder.timed('POST /admin/walkin-sales/new', lambda: client.post('/admin/walkin-sales/new', data=form),
+                   ok=lambda response: response.status_code == 302
+                   and response.headers.get('Location', '').endswith('/admin/walkin-sales'))
+
+
+def run_worker(tech13, index, args, recorder, product_ids, errors):
+    rng = random.Random(args.seed + index)
+    try:
+        customer = tech13.app.test_client()
+        login(customer, f'load{index % max(args.customers, 1)}', CUSTOMER_PASSWORD)
+        admin = tech13.app.test_client()
+        login(admin, 'admin', 'admin123')
+        for _ in range(args.iterations):
+            if rng.random() < args.walkin_ratio:
+                walkin_flow(admin, recorder, rng, product_ids)
+            else:
+                customer_flow(customer, recorder, rng, product_ids)
+    except BaseException as e:
+        errors.append(f"worker {index}: {e!r}")
+
+
+def run_micro_benchmarks(tech13, runs):
+    """Time the hot helpers directly, outside the request/response machinery"""
+    app = tech13.app
+    benchmarks = [
+        ('compute_dashboard_stats', lambda conn: tech13.compute_dashboard_stats(conn)),
+        ('products keyset page', lambda conn: tech13.fetch_keyset_page(conn, 'products', 24)),
+        ('products FTS search', lambda conn: conn.execute(tech13.product_search_query(), [
+            tech13.SNIPPET_START, tech13.SNIPPET_END, tech13.build_fts_query('racing brake'), 25, 0]).fetchall()),
+        ('sales analytics (12 months)', lambda conn: tech13.sales_analytics(
+            conn, 'month', tech13.default_analytics_start('month', datetime.now().date()), datetime.now().date())),
+    ]
+    print(f"\n{'micro-benchmark':<32}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, benchmark in benchmarks:
+        timings = []
+        with app.test_request_context('/products'):
+            conn = tech13.get_db_connection()
+            for _ in range(runs):
+                started = time.perf_counter()
+                benchmark(conn)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"{name:<32}{runs:>6}{percentile(timings, 50) * 1000:>10.2f}{percentile(timings, 95) * 1000:>10.2f}")
+
+
+def main():
+    args = parse_args()
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='tech13-load-'), 'load.db')
+    if os.path.abspath(db_path) == os.path.abspath(os.path.join(os.path.dirname(__file__), 'tech13_garage.db')):
+        sys.exit("Refusing to load-test the application database; pass a scratch --db path")
+
+    # app.py reads TECH13_DATABASE and migrates the scratch database on import
+    os.environ['TECH13_DATABASE'] = db_path
+    os.environ.pop('TECH13_SKIP_INIT_DB', None)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as tech13
+
+    rng = random.Random(args.seed)
+    with sqlite3.connect(db_path) as conn:
+        seeded = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0] > 0
+    if not (args.reuse and seeded):
+        started = time.perf_counter()
+        seed_database(tech13, db_path, args, rng)
+        print(f"Seeded {db_path}: {args.products} products, {args.customers} customers, "
+              f"{args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+    with sqlite3.connect(db_path) as conn:
+        product_ids = [row[0] for row in conn.execute('SELECT id FROM products WHERE stock_quantity > 10')]
+
+    recorder = Recorder()
+    errors = []
+    threads = [threading.Thread(target=run_worker, args=(tech13, i, args, recorder, product_ids, errors))
+               for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in recorder.samples.values())
+    print(f"\n{total} requests from {args.threads} threads in {wall:.1f}s ({total / wall:.1f} req/s)")
+    print(f"{'step':<32}{'count':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    slow_steps = []
+    for step, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        p95 = percentile(samples, 95) * 1000
+        print(f"{step:<32}{len(samples):>7}{len(samples) / wall:>9.1f}{percentile(samples, 50) * 1000:>10.1f}"
+              f"{p95:>10.1f}{percentile(samples, 99) * 1000:>10.1f}{recorder.failures[step]:>8}")
+        if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+            slow_steps.append(step)
+
+    if args.micro_runs:
+        run_micro_benchmarks(tech13, args.micro_runs)
+
+    for error in errors:
+        print(f"ERROR {error}")
+    if errors or any(recorder.failures.values()) or slow_steps:
+        if slow_steps:
+            print(f"FAIL p95 above {args.max_p95_ms} ms: {', '.join(slow_steps)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Production launcher for TECH13 Garage.
+
+    python serve.py            apply migrations, then start gunicorn (uvicorn on Windows)
+    python serve.py migrate    only apply migrations
+    python serve.py reload     apply migrations, then replace the running gunicorn without downtime
+
+Migrations run in their own process before any server worker imports app.py, and the
+server is started with TECH13_SKIP_INIT_DB=1 so workers never race on schema changes.
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(APP_DIR, 'gunicorn.conf.py')
+PIDFILE = os.environ.get('TECH13_PIDFILE', 'gunicorn.pid')
+
+
+def migrate():
+    """Run init-db in a child process; a failure stops the launch"""
+    env = dict(os.environ, TECH13_SKIP_INIT_DB='1')
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=APP_DIR, env=env)
+    if result.returncode != 0:
+        sys.exit(f"Database migration failed (exit code {result.returncode}); not starting the server")
+
+
+def start():
+    os.chdir(APP_DIR)
+    os.environ['TECH13_SKIP_INIT_DB'] = '1'
+    if os.name == 'nt':
+        # gunicorn needs fork(); uvicorn runs the ASGI entry point with its own worker processes
+        workers = os.environ.get('WEB_CONCURRENCY', str(os.cpu_count() or 1))
+        port = os.environ.get('PORT', '5000')
+        os.execv(sys.executable, [sys.executable, '-m', 'uvicorn', 'asgi:application',
+                                  '--host', '0.0.0.0', '--port', port, '--workers', workers])
+    # The gunicorn script rather than `python -m gunicorn`: a USR2 re-exec of the latter puts
+    # the gunicorn package first on sys.path, where gunicorn.http shadows the stdlib module
+    os.execvp('gunicorn', ['gunicorn', '--config', CONFIG_FILE, 'app:app'])
+
+
+def read_pid(path):
+    try:
+        with open(path) as pidfile:
+            return int(pidfile.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def reload():
+    """Graceful code reload: USR2 starts a new master beside the old one, then the old one is retired.
+
+    A plain HUP is not enough with preload_app, since new workers would fork from the old code.
+    """
+    pidfile = os.path.join(APP_DIR, PIDFILE)
+    old_pid = read_pid(pidfile)
+    if old_pid is None:
+        sys.exit(f"No running server found ({pidfile})")
+    os.kill(old_pid, signal.SIGUSR2)
+
+    # The new master writes <pidfile>.2 while the old one is alive, then renames it once promoted
+    new_pid = wait_for_pid(pidfile + '.2', lambda pid: pid != old_pid)
+    if new_pid is None:
+        sys.exit("New server did not start within 60 seconds; the old one is still serving")
+
+    time.sleep(5)  # let the new workers boot before the old ones stop accepting
+    os.kill(old_pid, signal.SIGTERM)
+    if wait_for_pid(pidfile, lambda pid: pid == new_pid) is None:
+        sys.exit(f"Old master {old_pid} was stopped but {new_pid} has not taken over {pidfile}")
+    print(f"Reloaded: master {old_pid} replaced by {new_pid}")
+
+
+def wait_for_pid(path, accept, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        pid = read_pid(path)
+        if pid and accept(pid):
+            return pid
+        time.sleep(0.5)
+    return None
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'start'
+    if command not in ('start', 'migrate', 'reload'):
+        sys.exit(__doc__)
+    migrate()
+    if command == 'start':
+        start()
+    elif command == 'reload':
+        reload()
@@ -9,5 +9,8 @@ echo Admin login: username=admin, password=admin123
 echo.
 echo Press Ctrl+C to stop the server
 echo.
-python app.py
+REM Migrations run once, then the app is served by uvicorn worker processes.
+REM Use "python app.py" for the development server.
+cd /d "%~dp0"
+python serve.py
 pause
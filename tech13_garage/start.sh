@@ -9,4 +9,7 @@ echo "Admin login: username=admin, password=admin123"
 echo ""
 echo "Press Ctrl+C to stop the server"
 echo ""
-python3 app.py
+# Migrations run once, then gunicorn serves with a worker pool (see gunicorn.conf.py).
+# Use `python3 app.py` for the development server.
+cd "$(dirname "$0")"
+exec python3 serve.py